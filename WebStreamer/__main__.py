@@ -4,17 +4,15 @@
 import sys
 import logging
 import asyncio
-import os
-import base64
-import requests
 from .vars import Var
 from aiohttp import web
 from pyrogram import idle
 from WebStreamer import bot_loop, utils
 from WebStreamer import StreamBot
+from WebStreamer.bot import multi_clients, work_loads
 from WebStreamer.server import web_server
-from WebStreamer.bot.clients import initialize_clients
-from WebStreamer.utils import TokenParser
+from WebStreamer.bot.clients import initialize_clients, warm_media_sessions
+from WebStreamer.utils import session_store
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,161 +28,99 @@ logging.getLogger("pyrogram").setLevel(logging.ERROR)
 
 server = web.AppRunner(web_server())
 
-# Initialize TokenParser
-parser = TokenParser()
-GITHUB_TOKEN = parser.get_github_token()
-GITHUB_USERNAME = parser.get_github_username()
-GITHUB_REPO = parser.get_github_repo()
-GITHUB_API_URL = "https://api.github.com"
+session_name = "WebStreamer"
+session_file = f"{session_name}.session"
 
-async def upload_to_github(file_path, repo_path):
-    try:
-        if not os.path.exists(file_path):
-            print(f"File {file_path} does not exist, skipping upload")
-            return
-        
-        # Construct the API URL for the file in the repository
-        url = f"{GITHUB_API_URL}/repos/{GITHUB_USERNAME}/{GITHUB_REPO}/contents/{repo_path}"
-        headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            # File exists, extract current content details
-            print(f"File Found: {repo_path}")
-            current_content = response.json()
-            sha = current_content.get('sha', '')
-            print(f"SHA: {sha}")
-        elif response.status_code == 404:
-            # File does not exist, initialize sha as empty string
-            print(f"File Not Found: {repo_path}")
-            sha = ''
-        else:
-            # Handle other response codes
-            print(f"Failed to check {repo_path} on GitHub. Status code: {response.status_code}")
-            response.raise_for_status()
-        
-        # Read the file content to upload
-        with open(file_path, "rb") as file:
-            content = base64.b64encode(file.read()).decode()
-        
-        # Prepare data for updating or creating the file
-        data = {
-            "message": f"Update {repo_path}",
-            "content": content,
-            "branch": "main"  # Adjust the branch as needed
-        }
-
-        if sha != '':
-            data["sha"] = sha
-        
-        # Send PUT request to update the file if sha is provided; otherwise, POST to create new file
-        headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-        print(f"Trying to Upload {file_path} to GitHub")
-        response = requests.put(url, json=data, headers=headers)
-        
-        response.raise_for_status()
-        
-        if response.status_code == 200 or response.status_code == 201:
-            print(f"Updated {repo_path} on GitHub")
-        else:
-            print(f"Failed to update {repo_path} on GitHub. Status code: {response.status_code}")
-    
-    except Exception as e:
-        print(f"Failed to upload {file_path} to GitHub")
-        print(e)
+def log_phase(name, started):
+    logging.info(f"{name} took {asyncio.get_event_loop().time() - started:.1f}s")
 
-async def download_from_github(repo_path):
+async def cache_bin_channel():
+    # Pre-cache BIN_CHANNEL peer to avoid "Peer id invalid" errors
+    started = asyncio.get_event_loop().time()
     try:
-        print(f"Downloading {repo_path} from GitHub")
-        print(f"Current directory: {os.getcwd()}")  # Print current working directory
-        
-        url = f"{GITHUB_API_URL}/repos/{GITHUB_USERNAME}/{GITHUB_REPO}/contents/{repo_path}"
-        headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            content = base64.b64decode(response.json()["content"])
-            
-            # Extract file name from repo_path
-            file_name = os.path.basename(repo_path)
-            file_path = os.path.join(os.getcwd(), file_name)
-            
-            # Write content to file
-            with open(file_path, "wb") as file:
-                file.write(content)
-            
-            print(f"Downloaded {repo_path} from GitHub to {file_path}")
-        
-        elif response.status_code == 404:
-            print(f"{repo_path} not found in GitHub, proceeding without session file")
-        else:
-            response.raise_for_status()
-    
+        from pyrogram import raw
+        # Fetch dialogs to ensure all accessible chats are cached
+        await StreamBot.invoke(raw.functions.messages.GetDialogs(
+            offset_date=0,
+            offset_id=0,
+            offset_peer=raw.types.InputPeerEmpty(),
+            limit=200,
+            hash=0
+        ))
+        logging.info(f"Successfully pre-cached dialogs including BIN_CHANNEL")
+
+        # Also try to explicitly get the BIN_CHANNEL chat
+        try:
+            chat = await StreamBot.get_chat(Var.BIN_CHANNEL)
+            logging.info(f"Successfully cached BIN_CHANNEL: {chat.title if hasattr(chat, 'title') else Var.BIN_CHANNEL}")
+        except Exception as e:
+            logging.warning(f"Could not explicitly cache BIN_CHANNEL chat: {e}")
+        log_phase("Pre-caching BIN_CHANNEL peer", started)
     except Exception as e:
-        print(f"Failed to download {repo_path} from GitHub, proceeding without session file")
-        print(e)
+        logging.error(f"Failed to pre-cache BIN_CHANNEL: {e}")
 
-session_name = "WebStreamer"
-session_file = f"{session_name}.session"
+async def start_clients():
+    """
+    Brings up the additional clients after the web server is already serving,
+    they join the pool one by one as they connect.
+    """
+    started = asyncio.get_event_loop().time()
+    await initialize_clients()
+    log_phase(f"Initializing clients ({len(multi_clients)} in pool)", started)
 
 async def start_services():
     try:
-        # Download session file from GitHub before starting the bot
-        print("-------------------- Downloading Session File --------------------")
-        await download_from_github(session_file)
+        if session_store:
+            # Download session file before starting the bot
+            print("-------------------- Downloading Session File --------------------")
+            started = asyncio.get_event_loop().time()
+            await session_store.download(session_file)
+            log_phase("Downloading session file", started)
 
         print()
         print("-------------------- Initializing Telegram Bot --------------------")
+        started = asyncio.get_event_loop().time()
         await StreamBot.start()
         bot_info = await StreamBot.get_me()
         StreamBot.username = bot_info.username
+        multi_clients[0] = StreamBot
+        work_loads[0] = 0
+        log_phase("Starting the bot", started)
+        print("------------------------------ DONE ------------------------------")
+        print()
+
+        # The web server comes up as soon as the bot is connected, everything
+        # else is brought up in the background while requests are served by
+        # the clients that are already in the pool.
+        print("--------------------- Initializing Web Server ---------------------")
+        started = asyncio.get_event_loop().time()
+        await server.setup()
+        bind_address = "0.0.0.0" if Var.ON_HEROKU else Var.BIND_ADDRESS
+        await web.TCPSite(server, bind_address, Var.PORT).start()
+        log_phase("Starting the web server", started)
         print("------------------------------ DONE ------------------------------")
         print()
 
-        # Upload session file to GitHub after starting the bot
-        print("-------------------- Uploading Session File --------------------")
-        await upload_to_github(session_file, session_file)
+        if Var.WARM_DCS:
+            print("------------------ Warming Up Media Sessions ------------------")
+            asyncio.create_task(warm_media_sessions())
 
         print("---------------------- Initializing Clients ----------------------")
-        await initialize_clients()
-        print("------------------------------ DONE ------------------------------")
-        
-        # Pre-cache BIN_CHANNEL peer to avoid "Peer id invalid" errors
+        asyncio.create_task(start_clients())
+
         if Var.BIN_CHANNEL:
             print("------------------ Pre-caching BIN_CHANNEL Peer ------------------")
-            try:
-                from pyrogram import raw
-                # Fetch dialogs to ensure all accessible chats are cached
-                await StreamBot.invoke(raw.functions.messages.GetDialogs(
-                    offset_date=0,
-                    offset_id=0,
-                    offset_peer=raw.types.InputPeerEmpty(),
-                    limit=200,
-                    hash=0
-                ))
-                logging.info(f"Successfully pre-cached dialogs including BIN_CHANNEL")
-                
-                # Also try to explicitly get the BIN_CHANNEL chat
-                try:
-                    chat = await StreamBot.get_chat(Var.BIN_CHANNEL)
-                    logging.info(f"Successfully cached BIN_CHANNEL: {chat.title if hasattr(chat, 'title') else Var.BIN_CHANNEL}")
-                except Exception as e:
-                    logging.warning(f"Could not explicitly cache BIN_CHANNEL chat: {e}")
-                    
-                print("------------------------------ DONE ------------------------------")
-            except Exception as e:
-                logging.error(f"Failed to pre-cache BIN_CHANNEL: {e}")
-                print("--------------------------- FAILED ------------------------------")
+            asyncio.create_task(cache_bin_channel())
+
+        if session_store:
+            # Upload session file after starting the bot, skipped if it didn't change
+            print("-------------------- Uploading Session File --------------------")
+            asyncio.create_task(session_store.upload(session_file))
+
         if Var.ON_HEROKU:
             print("------------------ Starting Keep Alive Service ------------------")
             print()
             asyncio.create_task(utils.ping_server())
-        print("--------------------- Initializing Web Server ---------------------")
-        await server.setup()
-        bind_address = "0.0.0.0" if Var.ON_HEROKU else Var.BIND_ADDRESS
-        await web.TCPSite(server, bind_address, Var.PORT).start()
-        print("------------------------------ DONE ------------------------------")
-        print()
         print("------------------------- Service Started -------------------------")
         print("                        bot =>> {}".format(bot_info.first_name))
         if bot_info.dc_id:
@@ -201,6 +137,8 @@ async def start_services():
 async def cleanup():
     await server.cleanup()
     await StreamBot.stop()
+    if session_store:
+        await session_store.close()
 
 if __name__ == "__main__":
     try:
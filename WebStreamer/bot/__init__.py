@@ -3,6 +3,8 @@
 
 from ..vars import Var
 from pyrogram import Client, utils
+from .client_pool import ClientPool
+from .admission import AdmissionController, Overloaded
 from os import getcwd
 
 # Updated MIN_CHANNEL_ID to support newer/larger channel IDs
@@ -25,3 +27,7 @@ StreamBot = Client(
 
 multi_clients = {}
 work_loads = {}
+client_pool = ClientPool(multi_clients, work_loads, Var.SCHEDULER_POLICY)
+admission = AdmissionController(
+    client_pool, Var.MAX_STREAMS, Var.MAX_STREAMS_PER_CLIENT, Var.STREAM_QUEUE_SIZE, Var.STREAM_QUEUE_TIMEOUT
+)
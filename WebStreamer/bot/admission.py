@@ -0,0 +1,127 @@
+import time
+import asyncio
+from collections import deque
+from typing import Deque, List
+from .client_pool import ClientPool
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        """Raised when a stream can't be admitted, the request should get a 503."""
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, pool: ClientPool, max_streams: int, max_per_client: int, queue_size: int, queue_timeout: float):
+        """Limits how many streams are served at once and queues the rest for a while.
+        attributes:
+            pool: the client pool new streams are placed on.
+            max_streams: the number of streams served at once, 0 for no limit.
+            max_per_client: the number of streams a single client serves at once, 0 for no limit.
+            queue_size: the number of requests that may wait for a free slot.
+            queue_timeout: the number of seconds a request waits before it's turned away.
+            active: the number of streams being served, the pool counts them per client.
+            admitted, rejected, timed_out, waited: counters for inspecting the queue.
+
+        requests that find the queue full or wait longer than queue_timeout are
+        rejected right away, so a spike sheds a few requests cleanly instead of
+        slowing down every stream at once. waiting requests are admitted in order.
+        """
+        self.pool = pool
+        self.max_streams = max_streams
+        self.max_per_client = max_per_client
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waited = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _full_clients(self) -> List[int]:
+        if not self.max_per_client:
+            return []
+        return [index for index, stats in list(self.pool.stats.items()) if stats.streams >= self.max_per_client]
+
+    def _can_admit(self) -> bool:
+        if self.max_streams and self.active >= self.max_streams:
+            return False
+        full = self._full_clients()
+        return any(index in self.pool.work_loads and index not in full for index in self.pool.clients)
+
+    def _admit(self) -> int:
+        index = self.pool.choose(exclude=self._full_clients())
+        self.active += 1
+        self.pool.stream_started(index)
+        self.admitted += 1
+        return index
+
+    async def acquire(self) -> int:
+        """
+        Returns the index of the client that serves the new stream, waiting for a free
+        slot if needed. raises Overloaded when the queue is full or the wait timed out.
+        """
+        self._wake()
+        if not self._waiters and self._can_admit():
+            return self._admit()
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise Overloaded(f"{len(self._waiters)} requests already waiting")
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            index = await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the wait ended, don't leak it
+                self.release(waiter.result())
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise Overloaded(f"no free slot within {self.queue_timeout}s") from None
+            raise
+        finally:
+            self.waited += time.monotonic() - started
+        return index
+
+    def release(self, index: int) -> None:
+        """
+        Frees the slot of a finished stream and admits the next waiting request.
+        """
+        self.active -= 1
+        self.pool.stream_finished(index)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._can_admit():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            waiter.set_result(self._admit())
+
+    def retry_after(self) -> int:
+        """
+        Returns a guess of how many seconds a turned away client should wait.
+        """
+        return max(1, int(self.queue_timeout))
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_streams": self.max_streams,
+            "max_per_client": self.max_per_client,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "waited": round(self.waited, 3),
+        }
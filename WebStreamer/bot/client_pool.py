@@ -0,0 +1,281 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Tuple
+from pyrogram.errors import FloodWait, InternalServerError, ServiceUnavailable
+from ..vars import Var
+
+HEALTHY = "healthy"
+COOLING_DOWN = "cooling_down"
+TRIPPED = "tripped"
+
+# what a client without samples is assumed to do until its first GetFile comes back,
+# if no other client has been measured yet either
+DEFAULT_LATENCY = 0.25
+DEFAULT_THROUGHPUT = 4 * 1024 * 1024
+
+# errors that say something about the client rather than the requested file
+HEALTH_ERRORS = (TimeoutError, asyncio.TimeoutError, OSError, InternalServerError, ServiceUnavailable)
+
+
+class ClientStats:
+    """Moving averages of how a single client performs.
+    attributes:
+        latency: the moving average of GetFile round trips in seconds.
+        throughput: the moving average of bytes per second of a GetFile request.
+        in_flight: the number of GetFile requests currently in flight.
+        pending_bytes: the number of bytes open streams still have to pull.
+        streams: the number of streams placed on the client that haven't finished,
+            counted from the moment they are admitted rather than once they start pulling.
+        requests: the number of GetFile requests measured.
+        state: HEALTHY, COOLING_DOWN or TRIPPED.
+        until: the unix time at which a cooling down or tripped client is healthy again.
+        error_rate: the moving average of failed GetFile requests.
+        errors: the number of GetFile requests failed in a row.
+        flood_waits: the number of FloodWait errors seen.
+    """
+
+    __slots__ = (
+        "latency",
+        "throughput",
+        "in_flight",
+        "pending_bytes",
+        "streams",
+        "requests",
+        "state",
+        "until",
+        "error_rate",
+        "errors",
+        "flood_waits",
+    )
+
+    def __init__(self):
+        self.latency = 0.0
+        self.throughput = 0.0
+        self.in_flight = 0
+        self.pending_bytes = 0
+        self.streams = 0
+        self.requests = 0
+        self.state = HEALTHY
+        self.until = 0.0
+        self.error_rate = 0.0
+        self.errors = 0
+        self.flood_waits = 0
+
+
+def least_loaded(pool: "ClientPool", candidates: List[int]) -> int:
+    """Picks the client with the fewest open streams."""
+    return min(candidates, key=lambda i: (pool.work_loads.get(i, 0), pool.get_stats(i).streams))
+
+
+def power_of_two_choices(pool: "ClientPool", candidates: List[int]) -> int:
+    """Picks the faster of two random clients."""
+    if len(candidates) < 2:
+        return candidates[0]
+    return min(random.sample(candidates, 2), key=pool.rank)
+
+
+def weighted_latency(pool: "ClientPool", candidates: List[int]) -> int:
+    """Picks the client expected to finish a new request first."""
+    return min(candidates, key=pool.rank)
+
+
+class ClientPool:
+    policies: Dict[str, Callable[["ClientPool", List[int]], int]] = {
+        "least_loaded": least_loaded,
+        "p2c": power_of_two_choices,
+        "weighted_latency": weighted_latency,
+    }
+
+    def __init__(self, clients: dict, work_loads: Dict[int, int], policy: str = "weighted_latency"):
+        """Chooses which client in multi_clients serves a new request.
+        attributes:
+            clients: the multi_clients dict.
+            work_loads: the number of open streams per client.
+            stats: the ClientStats per client.
+            policy: the name of the policy in ClientPool.policies used by choose.
+
+        the stats are updated by ByteStreamer for every upstream request,
+        so the weighted policies can tell a slow client from a busy one.
+        FloodWaits and failing requests move a client to COOLING_DOWN or TRIPPED,
+        tripped clients are left out of scheduling until their wait expires.
+        """
+        self.clients = clients
+        self.work_loads = work_loads
+        self.stats: Dict[int, ClientStats] = {}
+        if policy not in self.policies:
+            logging.warning(f"Unknown scheduler policy {policy}, using weighted_latency")
+            policy = "weighted_latency"
+        self.policy = policy
+
+    @classmethod
+    def register_policy(cls, name: str, policy: Callable[["ClientPool", List[int]], int]) -> None:
+        cls.policies[name] = policy
+
+    def get_stats(self, index: int) -> ClientStats:
+        stats = self.stats.get(index)
+        if stats is None:
+            stats = self.stats[index] = ClientStats()
+        return stats
+
+    def expected_time(self, index: int) -> float:
+        """
+        Returns the estimated number of seconds a new request on the client would take.
+        clients without samples are assumed to perform like the average measured client,
+        so an idle client isn't picked for every new stream just because it's unmeasured.
+        """
+        stats = self.get_stats(index)
+        latency, throughput = stats.latency, stats.throughput
+        if not stats.requests:
+            latency, throughput = self.average_performance()
+        queued = latency * (stats.in_flight + 1)
+        if throughput:
+            queued += stats.pending_bytes / throughput
+        return queued
+
+    def average_performance(self) -> Tuple[float, float]:
+        """
+        Returns the mean latency and throughput of the measured clients, or the defaults.
+        """
+        measured = [stats for stats in list(self.stats.values()) if stats.requests]
+        if not measured:
+            return DEFAULT_LATENCY, DEFAULT_THROUGHPUT
+        return (
+            sum(stats.latency for stats in measured) / len(measured),
+            sum(stats.throughput for stats in measured) / len(measured) or DEFAULT_THROUGHPUT,
+        )
+
+    def rank(self, index: int) -> Tuple[float, int, int, int]:
+        """
+        Orders clients by expected time, ties are broken by the requests and streams they already have.
+        streams that were placed but haven't started pulling yet only show up in the tie-break,
+        which keeps a burst of new streams from landing on the same client.
+        """
+        stats = self.get_stats(index)
+        return self.expected_time(index), stats.in_flight, stats.streams, self.work_loads.get(index, 0)
+
+    def get_state(self, index: int) -> str:
+        """
+        Returns the health state of the client, moving it back to HEALTHY once its wait expired.
+        """
+        stats = self.get_stats(index)
+        if stats.state != HEALTHY and stats.until <= time.time():
+            logging.info(f"Client {index} is healthy again")
+            stats.state = HEALTHY
+            stats.errors = 0
+            stats.error_rate = 0.0
+        return stats.state
+
+    def choose(self, exclude: Iterable[int] = ()) -> int:
+        """
+        Returns the index of the client that should serve a new request.
+        healthy clients are preferred over cooling down ones and tripped clients are skipped,
+        unless there is nothing else left.
+        """
+        available = [i for i in self.clients if i in self.work_loads]
+        candidates = [i for i in available if i not in exclude] or available
+        healthy = [i for i in candidates if self.get_state(i) == HEALTHY]
+        if not healthy:
+            healthy = [i for i in candidates if self.get_state(i) == COOLING_DOWN]
+        if not healthy:
+            return min(candidates, key=lambda i: self.get_stats(i).until)
+        return self.policies[self.policy](self, healthy)
+
+    def choose_many(self, first: int, width: int) -> List[int]:
+        """
+        Returns up to width distinct clients starting with first, leaving tripped clients out.
+        used to stripe a single large download over several clients.
+        """
+        chosen = [first]
+        while len(chosen) < width:
+            index = self.choose(exclude=chosen)
+            if index in chosen or self.get_state(index) == TRIPPED:
+                break
+            chosen.append(index)
+        return chosen
+
+    def request_started(self, index: int) -> None:
+        self.get_stats(index).in_flight += 1
+
+    def request_finished(self, index: int, latency: float, nbytes: int) -> None:
+        """
+        Folds a finished GetFile request into the moving averages of the client.
+        """
+        stats = self.get_stats(index)
+        stats.in_flight -= 1
+        stats.requests += 1
+        stats.errors = 0
+        alpha = Var.SCHEDULER_SMOOTHING
+        stats.error_rate -= alpha * stats.error_rate
+        if stats.requests == 1:
+            stats.latency = latency
+        else:
+            stats.latency += alpha * (latency - stats.latency)
+        if nbytes and latency > 0:
+            rate = nbytes / latency
+            stats.throughput = rate if stats.requests == 1 else stats.throughput + alpha * (rate - stats.throughput)
+
+    def request_failed(self, index: int, error: BaseException) -> None:
+        """
+        Records a failed GetFile request, FloodWaits and connection errors count against the client health.
+        """
+        stats = self.get_stats(index)
+        stats.in_flight -= 1
+        if isinstance(error, FloodWait):
+            self.flood_wait(index, error.value)
+        elif isinstance(error, HEALTH_ERRORS):
+            stats.errors += 1
+            stats.error_rate += Var.SCHEDULER_SMOOTHING * (1 - stats.error_rate)
+            if stats.state != TRIPPED and (
+                stats.errors >= Var.CIRCUIT_ERRORS or stats.error_rate >= Var.CIRCUIT_ERROR_RATE
+            ):
+                self.trip(index, Var.CIRCUIT_COOLDOWN, f"{stats.errors} errors in a row, last one {error!r}")
+
+    def flood_wait(self, index: int, seconds: int) -> None:
+        """
+        Takes the client out of rotation for the FloodWait duration,
+        long waits trip the client and short ones only cool it down.
+        """
+        stats = self.get_stats(index)
+        stats.flood_waits += 1
+        # an expired cooldown is reset first, so the new wait isn't lost to it
+        state = self.get_state(index)
+        if seconds >= Var.FLOOD_TRIP_THRESHOLD:
+            self.trip(index, seconds, f"FloodWait of {seconds}s")
+        else:
+            if state != TRIPPED:
+                logging.info(f"Client {index} is cooling down for {seconds}s after a FloodWait")
+                stats.state = COOLING_DOWN
+            stats.until = max(stats.until, time.time() + seconds)
+
+    def trip(self, index: int, seconds: float, reason: str) -> None:
+        stats = self.get_stats(index)
+        logging.warning(f"Client {index} tripped for {seconds}s: {reason}")
+        stats.state = TRIPPED
+        stats.until = max(stats.until, time.time() + seconds)
+
+    def stream_started(self, index: int) -> None:
+        self.get_stats(index).streams += 1
+
+    def stream_finished(self, index: int) -> None:
+        self.get_stats(index).streams -= 1
+
+    def add_pending_bytes(self, index: int, nbytes: int) -> None:
+        self.get_stats(index).pending_bytes += nbytes
+
+    def snapshot(self) -> Dict[int, dict]:
+        return {
+            index: {
+                "streams": self.work_loads.get(index, 0),
+                "in_flight": stats.in_flight,
+                "latency": round(stats.latency, 4),
+                "throughput": int(stats.throughput),
+                "pending_bytes": stats.pending_bytes,
+                "state": self.get_state(index),
+                "until": int(stats.until) if stats.state != HEALTHY else None,
+                "error_rate": round(stats.error_rate, 4),
+                "flood_waits": stats.flood_waits,
+            }
+            for index, stats in list(self.stats.items())
+        }
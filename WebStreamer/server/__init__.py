@@ -5,9 +5,12 @@
 
 from aiohttp import web
 from .stream_routes import routes
+from .metrics import metrics_middleware, on_response_prepare, register_collectors
 
 
 def web_server():
-    web_app = web.Application(client_max_size=30000000)
+    register_collectors()
+    web_app = web.Application(client_max_size=30000000, middlewares=[metrics_middleware])
+    web_app.on_response_prepare.append(on_response_prepare)
     web_app.add_routes(routes)
     return web_app
@@ -0,0 +1,140 @@
+import time
+import asyncio
+from typing import Dict, Tuple
+from aiohttp import web
+from WebStreamer import utils
+from WebStreamer.bot import multi_clients, work_loads, client_pool, admission
+from WebStreamer.bot.client_pool import HEALTHY, COOLING_DOWN, TRIPPED
+from WebStreamer.utils.metrics import registry, http_requests, http_latency
+
+
+def get_route(request: web.Request) -> str:
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else "unmatched"
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    """
+    Counts every request by route and status. streamed responses only return
+    once the whole body is sent, so the time until the headers are ready is
+    recorded by on_response_prepare instead.
+    """
+    request["metrics_started"] = time.monotonic()
+    route = get_route(request)
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    except asyncio.CancelledError:
+        # the client went away before the response was ready
+        status = 499
+        raise
+    finally:
+        http_requests.labels(route, request.method, status).inc()
+
+
+async def on_response_prepare(request: web.Request, response: web.StreamResponse) -> None:
+    """
+    Times a request until its response headers are sent, before any of a streamed body.
+    """
+    started = request.get("metrics_started")
+    if started is not None:
+        http_latency.labels(get_route(request)).observe(time.monotonic() - started)
+
+
+def get_caches() -> Dict[str, object]:
+    caches = {
+        "chunk": utils.chunk_cache,
+        "file": utils.file_cache,
+        "verified_links": utils.verifier,
+    }
+    if utils.disk_cache is not None:
+        caches["disk"] = utils.disk_cache
+    if utils.metadata_store is not None:
+        caches["metadata_store"] = utils.metadata_store
+    return caches
+
+
+def get_media_sessions() -> Dict[Tuple, int]:
+    from WebStreamer.utils.custom_dl import class_cache
+    sessions = {}
+    for index, client in list(multi_clients.items()):
+        tg_connect = class_cache.get(client)
+        if tg_connect is None:
+            continue
+        for dc_id, count in tg_connect.media_sessions.count().items():
+            sessions[(index, dc_id)] = count
+    return sessions
+
+
+def get_coalesced() -> Dict[Tuple, int]:
+    from WebStreamer.utils.custom_dl import chunk_flights, file_flights
+    return {("chunk",): chunk_flights.shared, ("file",): file_flights.shared}
+
+
+def register_collectors() -> None:
+    """
+    Exposes the state the client pool, the caches and the media session pools
+    already keep, it's only read when /metrics is scraped.
+    """
+    registry.collector(
+        "streamer_client_streams", "Streams currently served by each client.", "gauge", ["client"],
+        lambda: {(index,): load for index, load in list(work_loads.items())},
+    )
+    registry.collector(
+        "streamer_getfile_in_flight", "GetFile requests currently in flight per client.", "gauge", ["client"],
+        lambda: {(index,): stats.in_flight for index, stats in list(client_pool.stats.items())},
+    )
+    registry.collector(
+        "streamer_client_state", "Health state of each client, 1 for the current state.", "gauge", ["client", "state"],
+        lambda: {
+            (index, state): int(client_pool.get_state(index) == state)
+            for index in list(client_pool.stats)
+            for state in (HEALTHY, COOLING_DOWN, TRIPPED)
+        },
+    )
+    registry.collector(
+        "streamer_flood_waits_total", "FloodWait errors seen per client.", "counter", ["client"],
+        lambda: {(index,): stats.flood_waits for index, stats in list(client_pool.stats.items())},
+    )
+    registry.collector(
+        "streamer_cache_hits_total", "Lookups answered by each cache.", "counter", ["cache"],
+        lambda: {(name,): cache.hits for name, cache in get_caches().items()},
+    )
+    registry.collector(
+        "streamer_cache_misses_total", "Lookups each cache could not answer.", "counter", ["cache"],
+        lambda: {(name,): cache.misses for name, cache in get_caches().items()},
+    )
+    registry.collector(
+        "streamer_cache_bytes", "Bytes held by each chunk cache.", "gauge", ["cache"],
+        lambda: {
+            (name,): cache.current_bytes
+            for name, cache in get_caches().items()
+            if hasattr(cache, "current_bytes")
+        },
+    )
+    registry.collector(
+        "streamer_media_sessions", "Open media sessions per client and DC.", "gauge", ["client", "dc"],
+        get_media_sessions,
+    )
+    registry.collector(
+        "streamer_coalesced_requests_total", "Requests that joined an identical one already in flight.", "counter", ["kind"],
+        get_coalesced,
+    )
+    registry.collector(
+        "streamer_admission_streams", "Streams holding an admission slot and requests queued for one.", "gauge", ["state"],
+        lambda: {("active",): admission.active, ("queued",): admission.queued},
+    )
+    registry.collector(
+        "streamer_admission_total", "Streams admitted, rejected because the queue was full or timed out in it.", "counter", ["outcome"],
+        lambda: {
+            ("admitted",): admission.admitted,
+            ("rejected",): admission.rejected,
+            ("timed_out",): admission.timed_out,
+        },
+    )
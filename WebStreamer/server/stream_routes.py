@@ -10,20 +10,12 @@ import mimetypes
 import time
 from aiohttp import web
 from aiohttp.http_exceptions import BadStatusLine
-from WebStreamer import bot_loop
-from functools import partial
-from WebStreamer.bot import multi_clients, work_loads
+from WebStreamer.bot import multi_clients, client_pool, admission, Overloaded
 from WebStreamer.server.exceptions import FIleNotFound, InvalidHash
+from WebStreamer.utils.metrics import registry, write_stalls, admission_wait
 from WebStreamer import Var, utils, StartTime, __version__, StreamBot
-from concurrent.futures import ThreadPoolExecutor
 import urllib.parse
-
-THREADPOOL = ThreadPoolExecutor(max_workers=1000)
-
-async def sync_to_async(func, *args, wait=True, **kwargs):
-    pfunc = partial(func, *args, **kwargs)
-    future = bot_loop.run_in_executor(THREADPOOL, pfunc)
-    return await future if wait else future
+from typing import Dict, List, Tuple
 
 routes = web.RouteTableDef()
 @routes.get("/", allow_head=True)
@@ -32,6 +24,71 @@ async def root_route_handler(_):
             text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">All Systems Operational since '+utils.get_readable_time(time.time() - StartTime)+'</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
     )
 
+# route to inspect the health and load of every client
+@routes.get("/status", allow_head=True)
+async def status_route_handler(_):
+    return web.json_response({
+        "uptime": utils.get_readable_time(time.time() - StartTime),
+        "version": __version__,
+        "multi_client": Var.MULTI_CLIENT,
+        "clients": client_pool.snapshot(),
+        "admission": admission.snapshot(),
+    })
+
+# prometheus metrics of the clients, caches and routes
+@routes.get("/metrics")
+async def metrics_route_handler(_):
+    return web.Response(
+        body=registry.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+# route to check file names and sizes of many messages of a channel at once
+# eg. /info/batch/channelid?ids=1,2,3
+@routes.get("/info/batch/{channel}", allow_head=True)
+async def info_batch_route_handler(request: web.Request):
+    try:
+        try:
+            cid = int(request.match_info['channel'])
+            message_ids = list(dict.fromkeys(
+                int(fid) for fid in request.query.get("ids", "").split(",") if fid.strip()
+            ))
+        except ValueError:
+            message_ids = []
+        if not message_ids or len(message_ids) > Var.INFO_BATCH_LIMIT:
+            raise web.HTTPBadRequest(
+            text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Invalid Link</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
+        )
+
+        index = client_pool.choose()
+
+        if Var.MULTI_CLIENT:
+            logging.info(f"Client {index} is now serving {request.remote}")
+
+        tg_connect = get_streamer(index)
+        records = await tg_connect.get_file_properties_batch(message_ids, cid)
+        files = {}
+        for fid, record in records.items():
+            if record is None:
+                files[str(fid)] = None
+                continue
+            files[str(fid)] = {
+                "file_name": record.file_name,
+                "file_size": await formatFileSize(record.file_size),
+                "file_bytes": record.file_size,
+                "mime_type": record.mime_type,
+                "dc_id": record.dc_id,
+            }
+        return web.json_response({"channel_id": cid, "files": files})
+    except web.HTTPException:
+        raise
+    except Exception as e:
+        error_message = str(e)
+        logging.critical(error_message)
+        raise web.HTTPInternalServerError(
+            text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">'+error_message+'</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
+        )
+
 # route to check file name and size
 @routes.get("/info/{path:.*}", allow_head=True)
 async def info_route_handler(request: web.Request):
@@ -44,27 +101,20 @@ async def info_route_handler(request: web.Request):
         )
 
         cid, fid = parts
-        index = min(work_loads, key=work_loads.get)
-        faster_client = multi_clients[index]
+        index = client_pool.choose()
         
         if Var.MULTI_CLIENT:
             logging.info(f"Client {index} is now serving {request.remote}")
 
-        if faster_client in class_cache:
-            tg_connect = class_cache[faster_client]
-            logging.debug(f"Using cached ByteStreamer object for client {index}")
-        else:
-            logging.debug(f"Creating new ByteStreamer object for client {index}")
-            tg_connect = utils.ByteStreamer(faster_client)
-            class_cache[faster_client] = tg_connect
+        tg_connect = get_streamer(index)
         logging.debug("before calling get_file_properties")
         file_id = await tg_connect.get_file_properties(int(fid), int(cid))
         dc_id = file_id.dc_id
         file_name = file_id.file_name
         file_size = file_id.file_size
         #file_details = file_name + " " + str(await formatFileSize(file_size)) + " on DC " + str(dc_id)
-        return web.Response(
-            text="{\"file_name\":\"" + file_name + "\", \"file_size\":\"" + str(await formatFileSize(file_size)) + "\", \"dc_id\":" + str(dc_id) + "}", content_type="application/json"
+        return web.json_response(
+            {"file_name": file_name, "file_size": await formatFileSize(file_size), "dc_id": dc_id}
         )
     except FileNotFoundError as e:
         raise web.HTTPNotFound(
@@ -90,19 +140,26 @@ async def stream_handler(request: web.Request):
         )
 
         cid, fid, expiration_time, sha256_key = parts
+        if not (cid.lstrip("-").isdigit() and fid.isdigit() and expiration_time.isdigit()):
+            raise web.HTTPBadRequest(
+            text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Invalid Link</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
+        )
+
+        # both checks are cheap and run inline, before any Telegram work
         current_time = int(time.time())
         if int(expiration_time) < current_time:
             raise web.HTTPForbidden(
             text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Link Expired</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
         )
 
-        sha256_verified = await sync_to_async(utils.verify_sha256_key, cid, fid, expiration_time, sha256_key)
-        if not sha256_verified:
+        if not utils.verifier.verify(cid, fid, int(expiration_time), sha256_key):
             raise web.HTTPForbidden(
             text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Hash Manipulation Detected</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
         )
 
-        return await media_streamer(request, int(fid), int(cid))
+        return await media_streamer(request, int(fid), int(cid), int(expiration_time))
+    except web.HTTPException:
+        raise
     except InvalidHash as e:
         raise web.HTTPForbidden(
             text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Invalid File Hash - '+e.message+'</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
@@ -128,89 +185,232 @@ async def not_found(_):
         text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Page Not Found</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
     )
 
-class_cache = {}
+def get_streamer(index: int) -> "utils.ByteStreamer":
+    return utils.ByteStreamer.for_client(multi_clients[index])
+
+def get_content_headers(file_id: "utils.FileRecord") -> Tuple[str, str]:
+    """
+    Returns the Content-Type and Content-Disposition of a file.
+    """
+    mime_type = file_id.mime_type
+    file_name = file_id.file_name
+    disposition = "attachment"
+
+    if mime_type:
+        if not file_name:
+            try:
+                file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
+            except (IndexError, AttributeError):
+                file_name = f"{secrets.token_hex(2)}.unknown"
+    else:
+        if file_name:
+            mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        else:
+            mime_type = "application/octet-stream"
+            file_name = f"{secrets.token_hex(2)}.unknown"
+
+    if "video/" in mime_type or "audio/" in mime_type or "/html" in mime_type:
+        disposition = "inline"
+    return mime_type, f'{disposition}; filename="{file_name}"'
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """
+    Checks an If-None-Match or If-Range header against an ETag, If-Range only
+    allows strong comparison so W/ tags never match there.
+    """
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def get_cache_headers(file_id: "utils.FileRecord", expiration_time: int) -> Dict[str, str]:
+    """
+    Returns the ETag and Cache-Control of a file. The ETag is derived from the
+    unique_id Telegram gives the file, so it's the same on every client and link.
+    the max-age never outlives the link, so caches don't keep serving expired links.
+    """
+    headers = {}
+    if file_id.unique_id:
+        headers["ETag"] = f'"{file_id.unique_id}"'
+    max_age = min(Var.CACHE_MAX_AGE, expiration_time - int(time.time()))
+    if Var.CACHE_CONTROL and max_age > 0:
+        headers["Cache-Control"] = f"{Var.CACHE_CONTROL}, max-age={max_age}"
+    return headers
 
-async def media_streamer(request: web.Request, message_id: int, channel_id):
+async def yield_multipart(tg_connect, file_id, index: int, ranges: List[Tuple[int, int]], heads: List[bytes], tail: bytes):
+    # every part is a regular range read, so it goes through the chunk pipeline and caches
+    for (from_bytes, until_bytes), head in zip(ranges, heads):
+        yield head
+        parts = utils.plan_parts(from_bytes, until_bytes, Var.FIRST_CHUNK_SIZE * 1024)
+        body = tg_connect.yield_file(file_id, index, parts)
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await body.aclose()
+        yield b"\r\n"
+    yield tail
+
+async def stream_response(request: web.Request, body, status: int, headers: Dict[str, str]) -> web.StreamResponse:
+    """
+    Writes a streamed body in pieces of at most WRITE_BUFFER_SIZE, waiting for the
+    client to drain its socket after each one. While a slow client is backed up the
+    body isn't pulled, so yield_file stops fetching once its read-ahead is done.
+    """
+    response = web.StreamResponse(status=status, headers=headers)
+    buffer_size = Var.WRITE_BUFFER_SIZE * 1024
+    if request.transport is not None:
+        request.transport.set_write_buffer_limits(high=buffer_size, low=buffer_size // 4)
+    await response.prepare(request)
+
+    expected = int(headers["Content-Length"])
+    written = 0
+    stalled = 0.0
+    try:
+        async for chunk in body:
+            view = memoryview(chunk)
+            for start in range(0, len(view), buffer_size):
+                piece = view[start:start + buffer_size]
+                started = time.monotonic()
+                await response.write(piece)
+                stalled += time.monotonic() - started
+                written += len(piece)
+    except ConnectionResetError:
+        logging.debug(f"{request.remote} went away after {written} of {expected} bytes")
+        return response
+    except Exception as e:
+        # the headers are out, so all that's left is to cut the response short
+        logging.error(f"Error while streaming to {request.remote}: {e!r}")
+    finally:
+        # closing the body right away releases the media sessions and the workload
+        # of the stream instead of whenever the generator gets collected
+        await body.aclose()
+        write_stalls.observe(stalled)
+
+    if written != expected:
+        # the stream ended early, drop the connection so the client doesn't wait for the rest
+        logging.warning(f"Streamed {written} of {expected} bytes to {request.remote}, closing the connection")
+        response.force_close()
+    await response.write_eof()
+    return response
+
+async def admitted_stream(request: web.Request, open_body, status: int, headers: Dict[str, str]) -> web.StreamResponse:
+    """
+    Waits for an admission slot and streams open_body(index) from the client it was given.
+    when the server is too busy to take the stream it's answered with a 503 and Retry-After.
+    """
+    started = time.monotonic()
+    try:
+        index = await admission.acquire()
+    except Overloaded as e:
+        logging.warning(f"Turning away {request.remote}: {e.reason}")
+        return web.Response(
+            status=503,
+            headers={"Retry-After": str(admission.retry_after())},
+            text='<html> <head> <title>LinkerX CDN</title> <style> body{ margin:0; padding:0; width:100%; height:100%; color:#b0bec5; display:table; font-weight:100; font-family:Lato } .container{ text-align:center; display:table-cell; vertical-align:middle } .content{ text-align:center; display:inline-block } .message{ font-size:80px; margin-bottom:40px } .submessage{ font-size:40px; margin-bottom:40px } .copyright{ font-size:20px; } a{ text-decoration:none; color:#3498db } </style> </head> <body> <div class="container"> <div class="content"> <div class="message">LinkerX CDN</div> <div class="submessage">Too many streams right now, try again in a few seconds</div> <div class="copyright">Hash Hackers and LiquidX Projects</div> </div> </div> </body> </html>', content_type="text/html"
+        )
+    finally:
+        admission_wait.observe(time.monotonic() - started)
     try:
-        range_header = request.headers.get("Range", 0)
-        
-        index = min(work_loads, key=work_loads.get)
-        faster_client = multi_clients[index]
-        
         if Var.MULTI_CLIENT:
             logging.info(f"Client {index} is now serving {request.remote}")
+        return await stream_response(request, open_body(index), status, headers)
+    finally:
+        admission.release(index)
 
-        if faster_client in class_cache:
-            tg_connect = class_cache[faster_client]
-            logging.debug(f"Using cached ByteStreamer object for client {index}")
-        else:
-            logging.debug(f"Creating new ByteStreamer object for client {index}")
-            tg_connect = utils.ByteStreamer(faster_client)
-            class_cache[faster_client] = tg_connect
+async def media_streamer(request: web.Request, message_id: int, channel_id, expiration_time: int = 0):
+    try:
+        # the file record doesn't need an admission slot, any client can look it up
+        index = client_pool.choose()
+        tg_connect = get_streamer(index)
         logging.debug("before calling get_file_properties")
         file_id = await tg_connect.get_file_properties(message_id, channel_id)
         logging.debug("after calling get_file_properties")
 
         file_size = file_id.file_size
+        mime_type, disposition = get_content_headers(file_id)
+        cache_headers = get_cache_headers(file_id, expiration_time)
+        etag = cache_headers.get("ETag")
 
-        if range_header:
-            from_bytes, until_bytes = range_header.replace("bytes=", "").split("-")
-            from_bytes = int(from_bytes)
-            until_bytes = int(until_bytes) if until_bytes else file_size - 1
-        else:
-            from_bytes = request.http_range.start or 0
-            until_bytes = (request.http_range.stop or file_size) - 1
+        # conditional requests are answered from the file record alone
+        if etag and etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return web.Response(status=304, headers=cache_headers)
 
-        if (until_bytes > file_size) or (from_bytes < 0) or (until_bytes < from_bytes):
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and if_range and not (etag and etag_matches(if_range, etag, weak=False)):
+            # the client's copy is stale (or If-Range is a date, which we can't check), send it all
+            range_header = None
+
+        ranges = utils.parse_range(range_header, file_size)
+        if ranges == []:
             return web.Response(
                 status=416,
                 body="416: Range not satisfiable",
-                headers={"Content-Range": f"bytes */{file_size}"},
+                headers={"Content-Range": f"bytes */{file_size}", **cache_headers},
             )
 
-        chunk_size = 1024 * 1024
-        until_bytes = min(until_bytes, file_size - 1)
-
-        offset = from_bytes - (from_bytes % chunk_size)
-        first_part_cut = from_bytes - offset
-        last_part_cut = until_bytes % chunk_size + 1
+        if ranges is not None and len(ranges) > 1:
+            boundary = secrets.token_hex(16)
+            heads = [
+                (
+                    f"--{boundary}\r\nContent-Type: {mime_type}\r\n"
+                    f"Content-Range: bytes {from_bytes}-{until_bytes}/{file_size}\r\n\r\n"
+                ).encode()
+                for from_bytes, until_bytes in ranges
+            ]
+            tail = f"--{boundary}--\r\n".encode()
+            length = sum(len(head) + until_bytes - from_bytes + 1 + 2 for head, (from_bytes, until_bytes) in zip(heads, ranges))
+            headers = {
+                "Content-Type": f"multipart/byteranges; boundary={boundary}",
+                "Content-Length": str(length + len(tail)),
+                "Content-Disposition": disposition,
+                "Accept-Ranges": "bytes",
+                **cache_headers,
+            }
+            if request.method == "HEAD":
+                return web.Response(status=206, headers=headers)
+            return await admitted_stream(
+                request, lambda index: yield_multipart(get_streamer(index), file_id, index, ranges, heads, tail), 206, headers
+            )
 
+        from_bytes, until_bytes = ranges[0] if ranges else (0, file_size - 1)
         req_length = until_bytes - from_bytes + 1
-        part_count = math.ceil(until_bytes / chunk_size) - math.floor(offset / chunk_size)
-        body = tg_connect.yield_file(
-            file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
-        )
-        mime_type = file_id.mime_type
-        file_name = file_id.file_name
-        disposition = "attachment"
-
-        if mime_type:
-            if not file_name:
-                try:
-                    file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
-                except (IndexError, AttributeError):
-                    file_name = f"{secrets.token_hex(2)}.unknown"
-        else:
-            if file_name:
-                mime_type = mimetypes.guess_type(file_id.file_name)
-            else:
-                mime_type = "application/octet-stream"
-                file_name = f"{secrets.token_hex(2)}.unknown"
+        headers = {
+            "Content-Type": f"{mime_type}",
+            "Content-Length": str(req_length),
+            "Content-Disposition": disposition,
+            "Accept-Ranges": "bytes",
+            **cache_headers,
+        }
+        if ranges:
+            headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
 
-        if "video/" in mime_type or "audio/" in mime_type or "/html" in mime_type:
-            disposition = "inline"
+        # HEAD and empty files are answered from the file record alone,
+        # without a media session, a GetFile or counting towards the workload
+        if request.method == "HEAD" or not req_length:
+            return web.Response(status=206 if ranges else 200, headers=headers)
 
-        return web.Response(
-            status=206 if range_header else 200,
-            body=body,
-            headers={
-                "Content-Type": f"{mime_type}",
-                "Content-Range": f"bytes {from_bytes}-{until_bytes}/{file_size}",
-                "Content-Length": str(req_length),
-                "Content-Disposition": f'{disposition}; filename="{file_name}"',
-                "Accept-Ranges": "bytes",
-            },
-        )
+        # start small so seeks get their first bytes quickly, then grow to whole MiB requests
+        parts = utils.plan_parts(from_bytes, until_bytes, Var.FIRST_CHUNK_SIZE * 1024)
+
+        def open_body(index: int):
+            stripes = None
+            if Var.MULTI_CLIENT and Var.STRIPE_WIDTH > 1 and req_length >= Var.STRIPE_MIN_SIZE * 1024 * 1024:
+                stripe_indexes = client_pool.choose_many(index, Var.STRIPE_WIDTH)
+                if len(stripe_indexes) > 1:
+                    logging.info(f"Striping {request.remote} over clients {stripe_indexes}")
+                    stripes = [(i, get_streamer(i)) for i in stripe_indexes]
+            return get_streamer(index).yield_file(file_id, index, parts, stripes)
+
+        return await admitted_stream(request, open_body, 206 if ranges else 200, headers)
     except Exception as e:
         logging.error(f"Error in media streamer: {str(e)}")
         return web.Response(
@@ -5,5 +5,13 @@ from .keepalive import ping_server
 from .config_parser import TokenParser
 from .time_format import get_readable_time
 from .file_properties import get_hash, get_name
+from .chunk_cache import ChunkCache, chunk_cache
+from .disk_cache import DiskChunkCache, disk_cache
+from .metadata_cache import FileRecord, MetadataCache, file_cache
+from .metadata_store import MetadataStore, metadata_store
+from .session_store import SessionStore, LocalSessionStore, GitHubSessionStore, session_store
+from .metrics import Registry, registry
+from .range_planner import Part, plan_parts, parse_range
 from .custom_dl import ByteStreamer
-from .cryptography import verify_sha256_key, decrypt
+from .verification import SignatureVerifier, verifier, verify_sha256_key
+from .cryptography import decrypt
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from WebStreamer.vars import Var
+
+
+class ChunkCache:
+    def __init__(self, max_bytes: int):
+        """A process wide LRU cache of file chunks shared by every client.
+        attributes:
+            max_bytes: the byte budget of the cache, 0 disables caching.
+            current_bytes: the number of bytes currently held.
+            hits, misses, evictions: counters for inspecting the cache.
+
+        chunks are keyed by (media_id, offset) so every client in multi_clients
+        hits the same entries for the same file.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chunks: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+
+    def get(self, media_id: int, offset: int) -> Optional[bytes]:
+        """
+        Returns the cached chunk and marks it as recently used, or None on a miss.
+        """
+        key = (media_id, offset)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self.misses += 1
+            return None
+        self._chunks.move_to_end(key)
+        self.hits += 1
+        return chunk
+
+    def put(self, media_id: int, offset: int, chunk: bytes) -> None:
+        """
+        Stores a chunk, evicting the least recently used ones to stay in budget.
+        """
+        size = len(chunk)
+        if not size or size > self.max_bytes:
+            return
+        key = (media_id, offset)
+        old = self._chunks.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+        while self._chunks and self.current_bytes + size > self.max_bytes:
+            _, evicted = self._chunks.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+        self._chunks[key] = chunk
+        self.current_bytes += size
+
+    def clear(self) -> None:
+        self._chunks.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._chunks),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+chunk_cache = ChunkCache(Var.CHUNK_CACHE_SIZE * 1024 * 1024)
@@ -1,53 +1,103 @@
 import math
+import time
 import asyncio
 import logging
 from WebStreamer import Var
-from typing import Dict, Union
-from WebStreamer.bot import work_loads
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+from WebStreamer.bot import multi_clients, work_loads, client_pool
+from WebStreamer.bot.client_pool import HEALTHY
 from pyrogram import Client, utils, raw
-from .file_properties import get_file_ids
+from .chunk_cache import chunk_cache
+from .disk_cache import disk_cache
+from .single_flight import SingleFlight
+from .media_sessions import MediaSessionPool, PooledSession
+from .file_properties import get_file_ids, get_file_ids_batch
+from .range_planner import MAX_CHUNK_SIZE, Part
+from .metadata_cache import FileRecord, file_cache
+from .metadata_store import metadata_store
+from .metrics import bytes_served, getfile_latency
 from pyrogram.session import Session, Auth
-from pyrogram.errors import AuthBytesInvalid
+from pyrogram.errors import AuthBytesInvalid, FileReferenceExpired, FloodWait
 from WebStreamer.server.exceptions import FIleNotFound
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
 
+chunk_flights = SingleFlight()
+file_flights = SingleFlight()
+class_cache: Dict[Client, "ByteStreamer"] = {}
+
 
 class ByteStreamer:
     def __init__(self, client: Client):
-        """A custom class that holds the cache of a specific client and class functions.
+        """A custom class that holds the media sessions of a specific client and class functions.
         attributes:
-            client: the client that the cache is for.
-            cached_file_ids: a dict of cached file IDs.
-            cached_file_properties: a dict of cached file properties.
+            client: the client that the media sessions are for.
+            media_sessions: the pool of media sessions per DC.
+
+        file properties are kept in the shared file_cache so every client reuses them.
         
         functions:
             generate_file_properties: returns the properties for a media of a specific message contained in Tuple.
+            get_file_properties_batch: returns the properties for many messages of a channel at once.
+            load_file_properties: loads the properties from the metadata store or generates them.
+            refresh_file_properties: generates the properties again once the file reference expired.
             generate_media_session: returns the media session for the DC that contains the media file.
+            warm_up: opens media sessions for a list of DCs ahead of the first stream.
+            create_media_session: creates and authorizes a new media session for a DC.
+            fetch_chunk: requests a single chunk of the file from the media session.
             yield_file: yield a file from telegram servers for streaming.
             
         This is a modified version of the <https://github.com/eyaadh/megadlbot_oss/blob/master/mega/telegram/utils/custom_download.py>
         Thanks to Eyaadh <https://github.com/eyaadh>
         """
-        self.clean_timer = 30 * 60
         self.client: Client = client
-        self.cached_file_ids: Dict[int, FileId] = {}
-        asyncio.create_task(self.clean_cache())
+        self.media_sessions = MediaSessionPool(client, self.create_media_session)
 
-    async def get_file_properties(self, message_id: int, channel_id) -> FileId:
+    @classmethod
+    def for_client(cls, client: Client) -> "ByteStreamer":
         """
-        Returns the properties of a media of a specific message in a FIleId class.
+        Returns the ByteStreamer of the client, creating it on first use.
+        """
+        tg_connect = class_cache.get(client)
+        if tg_connect is None:
+            logging.debug("Creating new ByteStreamer object")
+            tg_connect = class_cache[client] = cls(client)
+        return tg_connect
+
+    async def get_file_properties(self, message_id: int, channel_id) -> FileRecord:
+        """
+        Returns the properties of a media of a specific message in a FileRecord class.
         if the properties are cached, then it'll return the cached results.
-        or it'll generate the properties from the Message ID and cache them.
+        or it'll load them from the metadata store or generate them from the Message ID and cache them.
+        concurrent lookups of the same message share a single generation.
         """
-        if message_id not in self.cached_file_ids:
-            await self.generate_file_properties(message_id, channel_id)
+        channel_id = int(channel_id)
+        record = file_cache.get(channel_id, message_id)
+        if record is None:
+            record = await file_flights.do(
+                (channel_id, message_id),
+                lambda: self.load_file_properties(message_id, channel_id),
+            )
             logging.debug(f"Cached file properties for message with ID {message_id}")
-        return self.cached_file_ids[message_id]
+        return record
+
+    async def load_file_properties(self, message_id: int, channel_id: int) -> FileRecord:
+        """
+        Loads the properties of a media file from the persistent metadata store if there is one.
+        or it'll generate them from the Message ID.
+        """
+        if metadata_store is not None:
+            record = await metadata_store.get(channel_id, message_id)
+            if record is not None:
+                logging.debug(f"Loaded stored properties for message with ID {message_id}")
+                file_cache.put(channel_id, message_id, record)
+                return record
+        return await self.generate_file_properties(message_id, channel_id)
     
-    async def generate_file_properties(self, message_id: int, channel_id) -> FileId:
+    async def generate_file_properties(self, message_id: int, channel_id) -> FileRecord:
         """
         Generates the properties of a media file on a specific message.
-        returns ths properties in a FIleId class.
+        returns ths properties in a FileRecord class.
         """
         logging.debug(f"Logging Channel ID {channel_id}")
         file_id = await get_file_ids(self.client, int(channel_id), message_id)
@@ -55,69 +105,130 @@ class ByteStreamer:
         if not file_id:
             logging.debug(f"Message with ID {message_id} not found")
             raise FIleNotFound
-        self.cached_file_ids[message_id] = file_id
+        record = FileRecord.from_file_id(file_id, int(channel_id), message_id)
+        file_cache.put(int(channel_id), message_id, record)
+        if metadata_store is not None:
+            metadata_store.put(int(channel_id), message_id, record)
         logging.debug(f"Cached media message with ID {message_id}")
-        return self.cached_file_ids[message_id]
+        return record
+
+    async def get_file_properties_batch(self, message_ids: List[int], channel_id) -> Dict[int, Optional[FileRecord]]:
+        """
+        Returns the properties of many messages of a channel, None for messages without media.
+        cached records are reused, the rest are read from the metadata store in one query
+        and whatever is still missing is generated with a single bulk lookup.
+        """
+        channel_id = int(channel_id)
+        records = {message_id: file_cache.get(channel_id, message_id) for message_id in message_ids}
+        missing = [message_id for message_id, record in records.items() if record is None]
+        if missing and metadata_store is not None:
+            stored = await metadata_store.get_many(channel_id, missing)
+            for message_id, record in stored.items():
+                file_cache.put(channel_id, message_id, record)
+                records[message_id] = record
+            missing = [message_id for message_id in missing if message_id not in stored]
+        if missing:
+            logging.debug(f"Generating file properties for {len(missing)} messages in one batch")
+            file_ids = await get_file_ids_batch(self.client, channel_id, missing)
+            for message_id, file_id in file_ids.items():
+                if file_id is None:
+                    continue
+                record = FileRecord.from_file_id(file_id, channel_id, message_id)
+                file_cache.put(channel_id, message_id, record)
+                if metadata_store is not None:
+                    metadata_store.put(channel_id, message_id, record)
+                records[message_id] = record
+        return records
+
+    async def refresh_file_properties(self, record: FileRecord) -> FileRecord:
+        """
+        Drops a record whose file reference expired from every cache and generates it again.
+        """
+        key = (record.channel_id, record.message_id)
+        fresh = file_cache.get(*key)
+        if fresh is not None and fresh.file_reference != record.file_reference:
+            return fresh
+        logging.debug(f"File reference expired for message with ID {record.message_id}")
+        file_cache.invalidate(*key)
+        if metadata_store is not None:
+            metadata_store.invalidate(*key)
+        return await file_flights.do(
+            key, lambda: self.generate_file_properties(record.message_id, record.channel_id)
+        )
 
-    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
+    async def generate_media_session(self, client: Client, file_id: FileRecord) -> PooledSession:
         """
-        Generates the media session for the DC that contains the media file.
+        Returns the least busy media session for the DC that contains the media file.
         This is required for getting the bytes from Telegram servers.
+        the session has to be given back with media_sessions.release once the stream is done.
+        concurrent requests for a new DC share a single session creation.
         """
+        return await self.media_sessions.acquire(file_id.dc_id)
 
-        media_session = client.media_sessions.get(file_id.dc_id, None)
+    async def warm_up(self, dc_ids: List[int]) -> None:
+        """
+        Opens and authorizes a media session for every DC ahead of the first stream,
+        and keeps them fresh in the background.
+        """
+        results = await asyncio.gather(
+            *[self.media_sessions.warm(dc_id) for dc_id in dc_ids], return_exceptions=True
+        )
+        for dc_id, result in zip(dc_ids, results):
+            if isinstance(result, BaseException):
+                logging.warning(f"Failed to warm up media session for DC {dc_id}: {result!r}")
 
-        if media_session is None:
-            if file_id.dc_id != await client.storage.dc_id():
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await Auth(
-                        client, file_id.dc_id, await client.storage.test_mode()
-                    ).create(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
+    @staticmethod
+    async def create_media_session(client: Client, dc_id: int) -> Session:
+        """
+        Creates and authorizes a new media session for the DC.
+        """
+        if dc_id != await client.storage.dc_id():
+            media_session = Session(
+                client,
+                dc_id,
+                await Auth(
+                    client, dc_id, await client.storage.test_mode()
+                ).create(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
 
-                for _ in range(6):
-                    exported_auth = await client.invoke(
-                        raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id)
-                    )
+            for _ in range(6):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
 
-                    try:
-                        await media_session.invoke(
-                            raw.functions.auth.ImportAuthorization(
-                                id=exported_auth.id, bytes=exported_auth.bytes
-                            )
-                        )
-                        break
-                    except AuthBytesInvalid:
-                        logging.debug(
-                            f"Invalid authorization bytes for DC {file_id.dc_id}"
+                try:
+                    await media_session.invoke(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id, bytes=exported_auth.bytes
                         )
-                        continue
-                else:
-                    await media_session.stop()
-                    raise AuthBytesInvalid
+                    )
+                    break
+                except AuthBytesInvalid:
+                    logging.debug(
+                        f"Invalid authorization bytes for DC {dc_id}"
+                    )
+                    continue
             else:
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await client.storage.auth_key(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-            logging.debug(f"Created media session for DC {file_id.dc_id}")
-            client.media_sessions[file_id.dc_id] = media_session
+                await media_session.stop()
+                raise AuthBytesInvalid
         else:
-            logging.debug(f"Using cached media session for DC {file_id.dc_id}")
+            media_session = Session(
+                client,
+                dc_id,
+                await client.storage.auth_key(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
+        logging.debug(f"Created media session for DC {dc_id}")
         return media_session
 
 
     @staticmethod
-    async def get_location(file_id: FileId) -> Union[raw.types.InputPhotoFileLocation,
+    async def get_location(file_id: Union[FileId, FileRecord]) -> Union[raw.types.InputPhotoFileLocation,
                                                      raw.types.InputDocumentFileLocation,
                                                      raw.types.InputPeerPhotoFileLocation,]:
         """
@@ -163,70 +274,220 @@ class ByteStreamer:
 
     async def yield_file(
         self,
-        file_id: FileId,
+        file_id: FileRecord,
         index: int,
-        offset: int,
-        first_part_cut: int,
-        last_part_cut: int,
-        part_count: int,
-        chunk_size: int,
+        parts: List[Part],
+        stripes: Optional[List[Tuple[int, "ByteStreamer"]]] = None,
     ) -> Union[str, None]:
         """
-        Custom generator that yields the bytes of the media file.
+        Custom generator that yields the bytes of the media file for the planned parts.
+        when stripes, a list of (index, ByteStreamer) starting with this client, is given
+        the parts are spread over those clients and yielded back in order.
         Modded from <https://github.com/eyaadh/megadlbot_oss/blob/master/mega/telegram/utils/custom_download.py#L20>
         Thanks to Eyaadh <https://github.com/eyaadh>
         """
-        client = self.client
-        work_loads[index] += 1
-        logging.debug(f"Starting to yielding file with client {index}.")
-        media_session = await self.generate_media_session(client, file_id)
+        stripes = list(stripes or [(index, self)])
+        for stripe_index, _ in stripes:
+            work_loads[stripe_index] += 1
+        logging.debug(f"Starting to yielding file with clients {[i for i, _ in stripes]}.")
 
+        part_count = len(parts)
         current_part = 1
-        location = await self.get_location(file_id)
+        location = None
+        # (index, ByteStreamer, media session) of every client pulling parts of this stream
+        lanes: List[Tuple[int, "ByteStreamer", PooledSession]] = []
+
+        # keep up to READ_AHEAD GetFile requests in flight per client, consumed in order
+        read_ahead = max(1, Var.READ_AHEAD)
+        pending: Deque[Tuple[asyncio.Task, Tuple[int, "ByteStreamer", PooledSession]]] = deque()
+        next_part = 1
 
+        def schedule_parts() -> None:
+            nonlocal next_part
+            while next_part <= part_count and len(pending) < read_ahead * len(lanes):
+                lane = lanes[(next_part - 1) % len(lanes)]
+                stripe_index, streamer, media_session = lane
+                part = parts[next_part - 1]
+                task = asyncio.ensure_future(
+                    streamer.fetch_chunk(
+                        file_id, stripe_index, media_session, location, part.offset, part.limit
+                    )
+                )
+                pending.append((task, lane))
+                next_part += 1
+
+        def cancel_parts() -> None:
+            for task, _ in pending:
+                if task.done() and not task.cancelled():
+                    task.exception()
+                task.cancel()
+            pending.clear()
+
+        # bytes this stream still has to pull, used by the client pool to estimate its load
+        pending_bytes = sum(part.last_cut - part.first_cut for part in parts)
+        client_pool.add_pending_bytes(index, pending_bytes)
+        served = bytes_served.labels(index)
+        refreshed = False
         try:
-            r = await media_session.invoke(
-                raw.functions.upload.GetFile(
-                    location=location, offset=offset, limit=chunk_size
-                ),
+            media_sessions = await asyncio.gather(
+                *[streamer.generate_media_session(streamer.client, file_id) for _, streamer in stripes],
+                return_exceptions=True,
             )
-            if isinstance(r, raw.types.upload.File):
-                while True:
-                    chunk = r.bytes
-                    if not chunk:
-                        break
-                    elif part_count == 1:
-                        yield chunk[first_part_cut:last_part_cut]
-                    elif current_part == 1:
-                        yield chunk[first_part_cut:]
-                    elif current_part == part_count:
-                        yield chunk[:last_part_cut]
+            failed = None
+            for (stripe_index, streamer), media_session in zip(stripes, media_sessions):
+                if isinstance(media_session, BaseException):
+                    if stripe_index == index:
+                        failed = media_session
                     else:
-                        yield chunk
+                        logging.warning(f"Client {stripe_index} left the stripe: {media_session!r}")
+                    continue
+                lanes.append((stripe_index, streamer, media_session))
+            # every acquired session is in lanes now, so the finally below gives them back
+            if failed is not None:
+                raise failed
+            location = await self.get_location(file_id)
 
-                    current_part += 1
-                    offset += chunk_size
+            schedule_parts()
+            while pending:
+                task, lane = pending.popleft()
+                try:
+                    chunk = await task
+                except FileReferenceExpired:
+                    if refreshed:
+                        raise
+                    # refresh the file reference once and retry from the current part
+                    refreshed = True
+                    cancel_parts()
+                    file_id = await self.refresh_file_properties(file_id)
+                    location = await self.get_location(file_id)
+                    next_part = current_part
+                    schedule_parts()
+                    continue
+                except (TimeoutError, FloodWait) as e:
+                    # hand the rest of the stream to the other clients of the stripe,
+                    # or to a healthy client outside of it if this was the last one
+                    logging.warning(f"Client {lane[0]} left the stream: {e!r}")
+                    lanes.remove(lane)
+                    lane[1].media_sessions.release(lane[2])
+                    cancel_parts()
+                    if not lanes:
+                        new_lane = await self.take_over(file_id, stripes)
+                        if new_lane is None:
+                            if not isinstance(e, FloodWait) or e.value > Var.SLEEP_THRESHOLD:
+                                raise
+                            # nowhere else to go, wait it out like pyrogram would have
+                            logging.info(f"No client can take over, waiting {e.value}s for client {lane[0]}")
+                            await asyncio.sleep(e.value)
+                            new_lane = (lane[0], lane[1], await lane[1].generate_media_session(lane[1].client, file_id))
+                        lanes.append(new_lane)
+                    next_part = current_part
+                    schedule_parts()
+                    continue
+                if not chunk:
+                    break
+                schedule_parts()
+                part = parts[current_part - 1]
+                client_pool.add_pending_bytes(index, part.first_cut - part.last_cut)
+                pending_bytes -= part.last_cut - part.first_cut
 
-                    if current_part > part_count:
-                        break
+                served.inc(part.last_cut - part.first_cut)
+                # edge chunks are cut with a view, the bytes are copied only once, into the socket
+                if part.first_cut or part.last_cut < len(chunk):
+                    yield memoryview(chunk)[part.first_cut:part.last_cut]
+                else:
+                    yield chunk
 
-                    r = await media_session.invoke(
-                        raw.functions.upload.GetFile(
-                            location=location, offset=offset, limit=chunk_size
-                        ),
-                    )
-        except (TimeoutError, AttributeError):
+                current_part += 1
+        except (TimeoutError, FloodWait) as e:
+            logging.warning(f"Client {index} stopped streaming after {current_part - 1} parts: {e!r}")
+        except AttributeError:
             pass
         finally:
-            logging.debug("Finished yielding file with {current_part} parts.")
-            work_loads[index] -= 1
+            cancel_parts()
+            for _, streamer, media_session in lanes:
+                streamer.media_sessions.release(media_session)
+            client_pool.add_pending_bytes(index, -pending_bytes)
+            logging.debug(f"Finished yielding file with {current_part} parts.")
+            for stripe_index, _ in stripes:
+                work_loads[stripe_index] -= 1
 
-    
-    async def clean_cache(self) -> None:
+    @staticmethod
+    async def take_over(
+        file_id: FileRecord, stripes: List[Tuple[int, "ByteStreamer"]]
+    ) -> Optional[Tuple[int, "ByteStreamer", PooledSession]]:
         """
-        function to clean the cache to reduce memory usage
+        Finds a healthy client that isn't part of the stream yet to pull the rest of it.
+        the client is added to stripes, so it's counted in work_loads until the stream ends.
+        returns None if there is no such client.
         """
+        used = [stripe_index for stripe_index, _ in stripes]
         while True:
-            await asyncio.sleep(self.clean_timer)
-            self.cached_file_ids.clear()
-            logging.debug("Cleaned the cache")
+            index = client_pool.choose(exclude=used)
+            if index in used or client_pool.get_state(index) != HEALTHY:
+                return None
+            used.append(index)
+            streamer = ByteStreamer.for_client(multi_clients[index])
+            work_loads[index] += 1
+            stripes.append((index, streamer))
+            try:
+                media_session = await streamer.generate_media_session(streamer.client, file_id)
+            except Exception as e:
+                logging.warning(f"Client {index} can't take over the stream: {e!r}")
+                continue
+            logging.info(f"Client {index} took over the stream")
+            return index, streamer, media_session
+
+    @staticmethod
+    async def fetch_chunk(
+        file_id: FileRecord,
+        index: int,
+        media_session: PooledSession,
+        location: Union[raw.types.InputPhotoFileLocation,
+                        raw.types.InputDocumentFileLocation,
+                        raw.types.InputPeerPhotoFileLocation,],
+        offset: int,
+        limit: int,
+    ) -> Optional[Union[bytes, memoryview]]:
+        """
+        Returns a single chunk of the media file, from the shared chunk caches if possible.
+        the in-memory cache is checked first, then the optional disk cache, smaller requests
+        get a memoryview into the cached chunk instead of a copy.
+        otherwise it'll request the chunk from Telegram servers with client index and cache it,
+        timing the request for the client pool and sharing the request with any other stream that wants the same chunk.
+        returns None if the DC answered with anything other than the file bytes.
+        """
+        # only whole MiB chunks are cached, smaller requests are cut out of the chunk that holds them
+        chunk_offset = offset - offset % MAX_CHUNK_SIZE
+        chunk = chunk_cache.get(file_id.media_id, chunk_offset)
+        if chunk is None and disk_cache is not None:
+            chunk = disk_cache.get(file_id.media_id, chunk_offset)
+        if chunk is not None:
+            if limit == MAX_CHUNK_SIZE:
+                return chunk
+            return memoryview(chunk)[offset - chunk_offset:offset - chunk_offset + limit]
+
+        async def request_chunk() -> Optional[bytes]:
+            client_pool.request_started(index)
+            started = time.monotonic()
+            try:
+                r = await media_session.invoke(
+                    raw.functions.upload.GetFile(
+                        location=location, offset=offset, limit=limit
+                    ),
+                )
+            except BaseException as e:
+                client_pool.request_failed(index, e)
+                raise
+            latency = time.monotonic() - started
+            client_pool.request_finished(index, latency, len(getattr(r, "bytes", b"")))
+            getfile_latency.labels(index, file_id.dc_id).observe(latency)
+            if isinstance(r, raw.types.upload.File):
+                if limit == MAX_CHUNK_SIZE:
+                    chunk_cache.put(file_id.media_id, offset, r.bytes)
+                    if disk_cache is not None:
+                        disk_cache.put(file_id.media_id, offset, r.bytes)
+                return r.bytes
+            return None
+
+        # concurrent streams of the same file share a single upstream request
+        return await chunk_flights.do((file_id.media_id, offset, limit), request_chunk)
@@ -0,0 +1,176 @@
+import os
+import mmap
+import time
+import asyncio
+import logging
+from functools import partial
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from WebStreamer.vars import Var
+
+# a tmp file this old is a leftover of a crashed write, not one still in progress
+STALE_TMP_AGE = 600
+
+
+class DiskChunkCache:
+    def __init__(self, cache_dir: str, max_bytes: int, max_pending: int = 16):
+        """An on-disk LRU store of file chunks that sits behind the in-memory chunk cache.
+        attributes:
+            cache_dir: the directory holding one file per chunk.
+            max_bytes: the size cap of the directory.
+            max_pending: the number of chunks that may wait to be written, each holds its chunk in memory.
+            current_bytes: the number of bytes currently stored.
+            hits, misses, evictions, skipped: counters for inspecting the cache.
+
+        chunks are written to a temporary file and renamed into place so a crash
+        never leaves a partial chunk behind, and the index is rebuilt from the
+        directory on restart. hits are served by memory-mapping the chunk file.
+        when the disk can't keep up with the network new chunks are skipped
+        rather than queued, so the backlog of writes can't grow without bound.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+        self._index: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._writing: Set[Tuple[int, int]] = set()
+        self.load_index()
+
+    def _path(self, media_id: int, offset: int) -> str:
+        return os.path.join(self.cache_dir, f"{media_id}_{offset}.chunk")
+
+    def load_index(self) -> None:
+        """
+        Rebuilds the index from the cache directory, oldest chunks first.
+        leftovers of interrupted writes are removed, unless they are recent enough
+        to be a write in progress of another process sharing the directory.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        now = time.time()
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    try:
+                        if now - entry.stat().st_mtime > STALE_TMP_AGE:
+                            self._remove_files([entry.path])
+                    except OSError:
+                        pass
+                    continue
+                if not entry.name.endswith(".chunk"):
+                    continue
+                try:
+                    media_id, offset = map(int, entry.name[:-len(".chunk")].rsplit("_", 1))
+                    stat = entry.stat()
+                except (ValueError, OSError):
+                    continue
+                if not stat.st_size:
+                    self._remove_files([entry.path])
+                    continue
+                entries.append((stat.st_mtime, (media_id, offset), stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.current_bytes += size
+        self._remove_files(self._evict())
+        logging.info(
+            f"Loaded {len(self._index)} chunks ({self.current_bytes} bytes) from disk cache {self.cache_dir}"
+        )
+
+    def get(self, media_id: int, offset: int) -> Optional[memoryview]:
+        """
+        Returns a memory-mapped view of the cached chunk, or None on a miss.
+        """
+        key = (media_id, offset)
+        if key not in self._index:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(media_id, offset), "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.current_bytes -= self._index.pop(key)
+            self.misses += 1
+            return None
+        self._index.move_to_end(key)
+        self.hits += 1
+        return memoryview(mapped)
+
+    def put(self, media_id: int, offset: int, chunk: bytes) -> None:
+        """
+        Writes a chunk to disk in the background and indexes it once it's in place.
+        the chunk is skipped if too many writes are already pending.
+        """
+        key = (media_id, offset)
+        size = len(chunk)
+        if key in self._index or key in self._writing or not size or size > self.max_bytes:
+            return
+        if len(self._writing) >= self.max_pending:
+            self.skipped += 1
+            return
+        self._writing.add(key)
+        future = asyncio.get_event_loop().run_in_executor(
+            None, self._write, self._path(media_id, offset), chunk
+        )
+        future.add_done_callback(partial(self._written, key, size))
+
+    def _written(self, key: Tuple[int, int], size: int, future: asyncio.Future) -> None:
+        self._writing.discard(key)
+        if future.cancelled():
+            return
+        if future.exception():
+            logging.warning(f"Failed to write chunk {key} to disk cache: {future.exception()}")
+            return
+        self._index[key] = size
+        self.current_bytes += size
+        evicted = self._evict()
+        if evicted:
+            asyncio.get_event_loop().run_in_executor(None, self._remove_files, evicted)
+
+    def _evict(self) -> List[str]:
+        paths = []
+        while self._index and self.current_bytes > self.max_bytes:
+            (media_id, offset), size = self._index.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+            paths.append(self._path(media_id, offset))
+        return paths
+
+    @staticmethod
+    def _write(path: str, chunk: bytes) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove_files(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._index),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+            "pending_writes": len(self._writing),
+        }
+
+
+disk_cache = (
+    DiskChunkCache(Var.DISK_CACHE_DIR, Var.DISK_CACHE_SIZE * 1024 * 1024, Var.DISK_CACHE_PENDING_WRITES)
+    if Var.DISK_CACHE_DIR
+    else None
+)
@@ -1,5 +1,5 @@
 from pyrogram import Client, raw, utils
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 from pyrogram.types import Message
 from pyrogram.file_id import FileId
 from pyrogram.raw.types.messages import Messages
@@ -125,9 +125,38 @@ async def get_file_ids(client: Client, chat_id: int, message_id: int) -> Optiona
     
     if message.empty:
         raise FIleNotFound
+    return await file_id_from_message(message)
+
+async def get_file_ids_batch(client: Client, chat_id: int, message_ids: List[int]) -> Dict[int, Optional[FileId]]:
+    """
+    Resolves many messages of a chat with one get_messages call per 200 IDs.
+    messages that are missing or have no media map to None.
+    """
+    file_ids = {}
+    for i in range(0, len(message_ids), 200):
+        batch = message_ids[i:i + 200]
+        try:
+            messages = await client.get_messages(chat_id, batch)
+        except Exception as e:
+            error_str = str(e).lower()
+            if "peer id invalid" not in error_str and "peer_id_invalid" not in error_str:
+                raise
+            logging.warning(f"Peer id invalid for chat {chat_id}, attempting to resolve peer...")
+            if not await resolve_peer_with_raw_api(client, chat_id):
+                await client.get_chat(chat_id)
+            messages = await client.get_messages(chat_id, batch)
+        for message in messages:
+            if message.empty or not get_media_from_message(message):
+                continue
+            file_ids[message.id] = await file_id_from_message(message)
+    return {message_id: file_ids.get(message_id) for message_id in message_ids}
+
+async def file_id_from_message(message: "Message") -> Optional[FileId]:
     media = get_media_from_message(message)
     file_unique_id = await parse_file_unique_id(message)
     file_id = await parse_file_id(message)
+    if file_id is None:
+        return None
     setattr(file_id, "file_size", getattr(media, "file_size", 0))
     setattr(file_id, "mime_type", getattr(media, "mime_type", ""))
     setattr(file_id, "file_name", getattr(media, "file_name", ""))
@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Set
+from pyrogram import Client, raw
+from pyrogram.session import Session
+from pyrogram.errors import InternalServerError, ServiceUnavailable
+from WebStreamer.vars import Var
+from .single_flight import SingleFlight
+
+# errors that say something about the connection rather than the request
+SESSION_ERRORS = (TimeoutError, asyncio.TimeoutError, OSError, InternalServerError, ServiceUnavailable)
+
+
+class PooledSession:
+    """A media session that keeps track of how busy and how healthy it is.
+    attributes:
+        session: the pyrogram media Session.
+        dc_id: the DC the session is connected to.
+        users: the number of streams currently holding the session.
+        in_flight: the number of requests currently in flight.
+        last_used: the monotonic time the session was last used.
+        errors: the number of requests failed in a row.
+        retired: the session was taken out of its pool and is stopped once the last stream releases it.
+    """
+
+    __slots__ = ("session", "dc_id", "users", "in_flight", "last_used", "errors", "retired")
+
+    def __init__(self, session: Session, dc_id: int):
+        self.session = session
+        self.dc_id = dc_id
+        self.users = 0
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self.errors = 0
+        self.retired = False
+
+    async def invoke(self, query):
+        """
+        Sends the query like Session.invoke, retrying connection errors, but raises every
+        FloodWait instead of sleeping through the ones below the client's sleep_threshold,
+        so the client pool sees them and can move the stream to another client.
+        """
+        self.in_flight += 1
+        self.last_used = time.monotonic()
+        try:
+            result = await self.send(query)
+        except SESSION_ERRORS:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+        self.errors = 0
+        return result
+
+    async def send(self, query, retries: int = Session.MAX_RETRIES):
+        try:
+            await asyncio.wait_for(self.session.is_connected.wait(), Session.WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        while True:
+            try:
+                return await self.session.send(query, timeout=Session.WAIT_TIMEOUT)
+            except SESSION_ERRORS as e:
+                if not retries:
+                    raise
+                retries -= 1
+                logging.debug(f"Retrying {type(query).__name__} due to {e!r}")
+                await asyncio.sleep(0.5)
+
+
+class MediaSessionPool:
+    def __init__(self, client: Client, create: Callable[[Client, int], Awaitable[Session]]):
+        """Up to MEDIA_SESSIONS_PER_DC media sessions per DC of a single client.
+        attributes:
+            client: the client the sessions belong to.
+            create: the coroutine function that creates and authorizes a session for a DC.
+            sessions: the pooled sessions per DC.
+            warm_dcs: the DCs that always keep a session open, see warm.
+
+        acquire hands out the least busy healthy session and opens another one
+        in the background while every session of the DC is busy, streams give
+        their session back with release.
+        sessions failing MEDIA_SESSION_ERRORS requests in a row are replaced and
+        sessions idle for MEDIA_SESSION_IDLE seconds are closed, except the last one of a warm DC.
+        """
+        self.client = client
+        self.create = create
+        self.sessions: Dict[int, List[PooledSession]] = {}
+        self.warm_dcs: Set[int] = set()
+        self.flights = SingleFlight()
+        asyncio.create_task(self.close_idle_sessions())
+
+    async def acquire(self, dc_id: int) -> PooledSession:
+        """
+        Returns the least busy healthy session of the DC, creating the first one if needed.
+        """
+        sessions = self.sessions.setdefault(dc_id, [])
+        for pooled in [s for s in sessions if s.errors >= Var.MEDIA_SESSION_ERRORS]:
+            logging.info(f"Replacing media session for DC {dc_id} after {pooled.errors} errors")
+            self.remove(pooled)
+        if sessions:
+            pooled = min(sessions, key=lambda s: (s.users, s.in_flight))
+        else:
+            pooled = await self.open(dc_id)
+        if pooled.users and len(sessions) < Var.MEDIA_SESSIONS_PER_DC:
+            asyncio.ensure_future(self.open(dc_id)).add_done_callback(self._log_error)
+        pooled.users += 1
+        pooled.last_used = time.monotonic()
+        return pooled
+
+    def release(self, pooled: PooledSession) -> None:
+        pooled.users -= 1
+        pooled.last_used = time.monotonic()
+        if pooled.retired and not pooled.users:
+            self.stop(pooled)
+
+    async def warm(self, dc_id: int) -> None:
+        """
+        Opens a session for the DC if it has none and keeps one open from now on,
+        refreshing it every WARM_REFRESH_INTERVAL seconds so it never goes stale.
+        """
+        if not self.warm_dcs:
+            asyncio.create_task(self.refresh_warm_sessions())
+        self.warm_dcs.add(dc_id)
+        if not self.sessions.get(dc_id):
+            await self.open(dc_id)
+            logging.debug(f"Warmed up media session for DC {dc_id}")
+
+    async def refresh_warm_sessions(self) -> None:
+        """
+        function to check the sessions of the warm DCs and replace the broken ones
+        """
+        while True:
+            await asyncio.sleep(Var.WARM_REFRESH_INTERVAL)
+            for dc_id in list(self.warm_dcs):
+                for pooled in list(self.sessions.get(dc_id, [])):
+                    # sessions held by streams are checked by their requests already
+                    if pooled.in_flight or pooled.users:
+                        continue
+                    try:
+                        await asyncio.wait_for(pooled.invoke(raw.functions.help.GetConfig()), 30)
+                    except Exception as e:
+                        logging.info(f"Replacing stale media session for DC {dc_id}: {e!r}")
+                        self.remove(pooled)
+                if not self.sessions.get(dc_id):
+                    try:
+                        await self.open(dc_id)
+                    except Exception as e:
+                        logging.warning(f"Failed to reopen media session for DC {dc_id}: {e!r}")
+
+    async def open(self, dc_id: int) -> PooledSession:
+        """
+        Opens one more session for the DC, concurrent calls share the same creation.
+        """
+        slot = len(self.sessions.setdefault(dc_id, []))
+        return await self.flights.do((dc_id, slot), lambda: self._open(dc_id))
+
+    async def _open(self, dc_id: int) -> PooledSession:
+        pooled = PooledSession(await self.create(self.client, dc_id), dc_id)
+        sessions = self.sessions.setdefault(dc_id, [])
+        sessions.append(pooled)
+        self.client.media_sessions.setdefault(dc_id, pooled.session)
+        logging.debug(f"Media session pool for DC {dc_id} has {len(sessions)} sessions")
+        return pooled
+
+    def remove(self, pooled: PooledSession) -> None:
+        """
+        Takes a session out of the pool and stops it in the background,
+        once the streams still holding it have released it.
+        """
+        sessions = self.sessions.get(pooled.dc_id, [])
+        if pooled in sessions:
+            sessions.remove(pooled)
+        if self.client.media_sessions.get(pooled.dc_id) is pooled.session:
+            if sessions:
+                self.client.media_sessions[pooled.dc_id] = sessions[0].session
+            else:
+                del self.client.media_sessions[pooled.dc_id]
+        pooled.retired = True
+        if not pooled.users:
+            self.stop(pooled)
+
+    def stop(self, pooled: PooledSession) -> None:
+        asyncio.ensure_future(pooled.session.stop()).add_done_callback(self._log_error)
+
+    async def close_idle_sessions(self) -> None:
+        """
+        function to close the sessions that haven't been used for a while
+        """
+        while True:
+            await asyncio.sleep(60)
+            deadline = time.monotonic() - Var.MEDIA_SESSION_IDLE
+            for dc_id, sessions in list(self.sessions.items()):
+                for pooled in list(sessions):
+                    if dc_id in self.warm_dcs and len(sessions) == 1:
+                        break
+                    if not pooled.users and not pooled.in_flight and pooled.last_used < deadline:
+                        logging.debug(f"Closing idle media session for DC {pooled.dc_id}")
+                        self.remove(pooled)
+
+    def count(self) -> Dict[int, int]:
+        return {dc_id: len(sessions) for dc_id, sessions in self.sessions.items() if sessions}
+
+    @staticmethod
+    def _log_error(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception():
+            logging.warning(f"Media session pool error: {future.exception()!r}")
@@ -0,0 +1,151 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from pyrogram.file_id import FileId, FileType
+from WebStreamer.vars import Var
+
+
+class FileRecord:
+    """The parts of a media file that are needed to stream it.
+    attributes:
+        channel_id, message_id: the message the media file was found on.
+        file_type, dc_id, media_id, access_hash, file_reference, thumbnail_size:
+            the fields needed to build the file location.
+        file_size, mime_type, file_name, unique_id: the fields sent to the viewer.
+        expires_at: the unix time after which the record is stale.
+    """
+
+    __slots__ = (
+        "channel_id",
+        "message_id",
+        "file_type",
+        "dc_id",
+        "media_id",
+        "access_hash",
+        "file_reference",
+        "thumbnail_size",
+        "file_size",
+        "mime_type",
+        "file_name",
+        "unique_id",
+        "expires_at",
+    )
+
+    def __init__(
+        self,
+        channel_id: int,
+        message_id: int,
+        file_type: FileType,
+        dc_id: int,
+        media_id: int,
+        access_hash: int,
+        file_reference: bytes,
+        thumbnail_size: str,
+        file_size: int,
+        mime_type: str,
+        file_name: str,
+        unique_id: str,
+        expires_at: float = 0,
+    ):
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.file_type = file_type
+        self.dc_id = dc_id
+        self.media_id = media_id
+        self.access_hash = access_hash
+        self.file_reference = file_reference
+        self.thumbnail_size = thumbnail_size
+        self.file_size = file_size
+        self.mime_type = mime_type
+        self.file_name = file_name
+        self.unique_id = unique_id
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_file_id(cls, file_id: FileId, channel_id: int, message_id: int) -> "FileRecord":
+        """
+        Builds a record from a FileId decorated by get_file_ids.
+        """
+        return cls(
+            channel_id=channel_id,
+            message_id=message_id,
+            file_type=file_id.file_type,
+            dc_id=file_id.dc_id,
+            media_id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumbnail_size=file_id.thumbnail_size,
+            file_size=getattr(file_id, "file_size", 0) or 0,
+            mime_type=getattr(file_id, "mime_type", "") or "",
+            file_name=getattr(file_id, "file_name", "") or "",
+            unique_id=getattr(file_id, "unique_id", "") or "",
+        )
+
+
+class MetadataCache:
+    def __init__(self, max_entries: int, ttl: int):
+        """A process wide LRU cache of file records shared by every client.
+        attributes:
+            max_entries: the maximum number of records kept.
+            ttl: the number of seconds a record stays fresh.
+            hits, misses, evictions: counters for inspecting the cache.
+
+        records are keyed by (channel_id, message_id) and expire one by one,
+        so there is never a moment where the whole cache goes cold at once.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._records: "OrderedDict[Tuple[int, int], FileRecord]" = OrderedDict()
+
+    def get(self, channel_id: int, message_id: int) -> Optional[FileRecord]:
+        """
+        Returns the cached record and marks it as recently used, or None if it's missing or stale.
+        """
+        key = (channel_id, message_id)
+        record = self._records.get(key)
+        if record is None:
+            self.misses += 1
+            return None
+        if record.expires_at <= time.time():
+            del self._records[key]
+            self.misses += 1
+            return None
+        self._records.move_to_end(key)
+        self.hits += 1
+        return record
+
+    def put(self, channel_id: int, message_id: int, record: FileRecord) -> None:
+        """
+        Stores a record, stamping its expiry if it has none and evicting the least recently used ones if full.
+        """
+        if self.max_entries <= 0:
+            return
+        key = (channel_id, message_id)
+        if not record.expires_at:
+            record.expires_at = time.time() + self.ttl
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, channel_id: int, message_id: int) -> None:
+        self._records.pop((channel_id, message_id), None)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._records),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+file_cache = MetadataCache(Var.FILE_CACHE_SIZE, Var.FILE_CACHE_TTL)
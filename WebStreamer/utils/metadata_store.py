@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from pyrogram.file_id import FileType
+from WebStreamer.vars import Var
+from .metadata_cache import FileRecord
+
+COLUMNS = (
+    "file_type, dc_id, media_id, access_hash, file_reference, thumbnail_size, "
+    "file_size, mime_type, file_name, unique_id"
+)
+# older SQLite builds allow 999 bound parameters per query
+MAX_QUERY_IDS = 900
+
+
+class MetadataStore:
+    def __init__(self, path: str, ttl: int):
+        """A SQLite backed store of file records that survives restarts.
+        attributes:
+            path: the SQLite database file.
+            ttl: the number of seconds a stored record stays usable.
+            hits, misses: counters for inspecting the store.
+
+        the database is opened on first use and every query runs on a single
+        worker thread, so lookups never block the event loop and writes are
+        fire and forget.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata_store")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, "
+                "file_type INTEGER, dc_id INTEGER, media_id INTEGER, access_hash INTEGER, "
+                "file_reference BLOB, thumbnail_size TEXT, file_size INTEGER, "
+                "mime_type TEXT, file_name TEXT, unique_id TEXT, expires_at REAL, "
+                "PRIMARY KEY (channel_id, message_id)) WITHOUT ROWID"
+            )
+            db.execute("DELETE FROM files WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            logging.info(f"Opened metadata store {self.path}")
+            self._db = db
+        return self._db
+
+    def _run(self, func, *args) -> asyncio.Future:
+        return asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _select(self, channel_id: int, message_id: int) -> Optional[FileRecord]:
+        row = self._connect().execute(
+            f"SELECT {COLUMNS} FROM files WHERE channel_id = ? AND message_id = ? AND expires_at > ?",
+            (channel_id, message_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        file_type, *fields = row
+        return FileRecord(channel_id, message_id, FileType(file_type), *fields)
+
+    def _select_many(self, channel_id: int, message_ids: List[int]) -> Dict[int, FileRecord]:
+        db = self._connect()
+        records = {}
+        now = time.time()
+        for i in range(0, len(message_ids), MAX_QUERY_IDS):
+            batch = message_ids[i:i + MAX_QUERY_IDS]
+            rows = db.execute(
+                f"SELECT message_id, {COLUMNS} FROM files WHERE channel_id = ? "
+                f"AND message_id IN ({', '.join('?' * len(batch))}) AND expires_at > ?",
+                (channel_id, *batch, now),
+            ).fetchall()
+            for message_id, file_type, *fields in rows:
+                records[message_id] = FileRecord(channel_id, message_id, FileType(file_type), *fields)
+        return records
+
+    def _upsert(self, channel_id: int, message_id: int, record: FileRecord) -> None:
+        db = self._connect()
+        db.execute(
+            f"INSERT OR REPLACE INTO files (channel_id, message_id, {COLUMNS}, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                channel_id, message_id, int(record.file_type), record.dc_id, record.media_id,
+                record.access_hash, record.file_reference, record.thumbnail_size,
+                record.file_size, record.mime_type, record.file_name, record.unique_id,
+                time.time() + self.ttl,
+            ),
+        )
+        db.commit()
+
+    def _delete(self, channel_id: int, message_id: int) -> None:
+        db = self._connect()
+        db.execute(
+            "DELETE FROM files WHERE channel_id = ? AND message_id = ?",
+            (channel_id, message_id),
+        )
+        db.commit()
+
+    async def get(self, channel_id: int, message_id: int) -> Optional[FileRecord]:
+        """
+        Returns the stored record of a message, or None if it's missing or stale.
+        """
+        try:
+            record = await self._run(self._select, channel_id, message_id)
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to read metadata store: {e}")
+            record = None
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    async def get_many(self, channel_id: int, message_ids: List[int]) -> Dict[int, FileRecord]:
+        """
+        Returns the stored records of many messages of a channel, missing and stale ones are left out.
+        """
+        if not message_ids:
+            return {}
+        try:
+            records = await self._run(self._select_many, channel_id, list(message_ids))
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to read metadata store: {e}")
+            records = {}
+        self.hits += len(records)
+        self.misses += len(message_ids) - len(records)
+        return records
+
+    def put(self, channel_id: int, message_id: int, record: FileRecord) -> None:
+        """
+        Stores a record in the background.
+        """
+        self._run(self._upsert, channel_id, message_id, record).add_done_callback(self._log_error)
+
+    def invalidate(self, channel_id: int, message_id: int) -> None:
+        """
+        Removes a record in the background, eg. once its file reference expired.
+        """
+        self._run(self._delete, channel_id, message_id).add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception():
+            logging.warning(f"Failed to write metadata store: {future.exception()}")
+
+
+metadata_store = (
+    MetadataStore(Var.METADATA_STORE, Var.METADATA_STORE_TTL)
+    if Var.METADATA_STORE
+    else None
+)
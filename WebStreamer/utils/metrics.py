@@ -0,0 +1,215 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# GetFile and HTTP latencies in seconds, from a cache hit on a nearby DC to a slow one
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """A metric family in the Prometheus text format.
+        attributes:
+            name, documentation: the name and HELP text of the family.
+            labelnames: the label names of its samples.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """
+        Returns the sample lines of the family.
+        """
+
+    def render(self) -> str:
+        return "\n".join(
+            [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples()]
+        )
+
+
+class LabeledMetric(Metric):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """A metric family that keeps its own children, looked up by their label values.
+        children are kept by the raw label values and only turned into text
+        when the metrics are scraped, so updating one is a dict lookup and
+        an addition. callers on a hot path can keep the child around.
+        """
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[Tuple, object] = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Returns the state of a new child.
+        """
+
+
+class Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(LabeledMetric):
+    type = "counter"
+
+    def _new_child(self) -> Value:
+        return Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, values)} {format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(LabeledMetric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> Buckets:
+        return Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = format_labels(self.labelnames, values, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Collector(Metric):
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple, float]]):
+        """A metric family read from state that is already tracked somewhere else,
+        eg. the cache counters or work_loads, when the metrics are scraped.
+        collect returns the value of every child keyed by its label values.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.type = kind
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, values)} {format_value(value)}"
+            for values, value in self.collect().items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, documentation: str, kind: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple, float]]) -> Collector:
+        return self.register(Collector(name, documentation, kind, labelnames, collect))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in list(self.metrics.values())) + "\n"
+
+
+registry = Registry()
+
+bytes_served = registry.counter(
+    "streamer_bytes_served_total", "Bytes of file content sent to clients.", ["client"]
+)
+getfile_latency = registry.histogram(
+    "streamer_getfile_seconds", "Latency of upload.GetFile requests.", ["client", "dc"]
+)
+http_requests = registry.counter(
+    "streamer_http_requests_total", "HTTP requests by route and status.", ["route", "method", "status"]
+)
+http_latency = registry.histogram(
+    "streamer_http_request_seconds", "Time until the response headers are ready.", ["route"]
+)
+write_stalls = registry.histogram(
+    "streamer_write_stall_seconds", "Time each streamed response spent waiting for the client to drain its socket."
+)
+admission_wait = registry.histogram(
+    "streamer_admission_wait_seconds", "Time streams waited for a free slot before they were admitted or turned away."
+)
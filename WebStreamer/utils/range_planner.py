@@ -0,0 +1,95 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+# upload.GetFile limits: a request is a power of two between 4 KiB and 1 MiB
+# and its offset has to be a multiple of its size, so it never crosses a MiB boundary
+MIN_CHUNK_SIZE = 4 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# a Range header with more ranges than this is ignored instead of served as multipart
+MAX_RANGES = 16
+
+
+class Part(NamedTuple):
+    """A single GetFile request of a range.
+    attributes:
+        offset, limit: the GetFile offset and limit.
+        first_cut, last_cut: the slice of the returned chunk that belongs to the range.
+    """
+    offset: int
+    limit: int
+    first_cut: int
+    last_cut: int
+
+
+def plan_parts(from_bytes: int, until_bytes: int, first_chunk_size: int = MAX_CHUNK_SIZE) -> List[Part]:
+    """
+    Splits the inclusive byte range into aligned GetFile requests.
+    when first_chunk_size is below a MiB the range starts with a request of that size,
+    or smaller if the range fits in less, so seeks and probes get their first bytes quickly.
+    the rest of the range is planned as whole MiB requests, which are the ones that get cached
+    and are requested alongside the small one by the read-ahead in yield_file.
+    first_chunk_size is rounded down to a power of two of at least 4 KiB, a valid GetFile limit.
+    """
+    parts = []
+    if first_chunk_size < MAX_CHUNK_SIZE:
+        size = max(MIN_CHUNK_SIZE, first_chunk_size)
+        size = 1 << (size.bit_length() - 1)
+        while size > MIN_CHUNK_SIZE and from_bytes // (size // 2) == until_bytes // (size // 2):
+            size //= 2
+        offset = from_bytes - from_bytes % size
+        parts.append(Part(offset, size, from_bytes - offset, min(until_bytes - offset + 1, size)))
+        from_bytes = offset + size
+        if from_bytes > until_bytes:
+            return parts
+
+    offset = from_bytes - from_bytes % MAX_CHUNK_SIZE
+    while offset <= until_bytes:
+        first_cut = max(from_bytes - offset, 0)
+        last_cut = min(until_bytes - offset + 1, MAX_CHUNK_SIZE)
+        parts.append(Part(offset, MAX_CHUNK_SIZE, first_cut, last_cut))
+        offset += MAX_CHUNK_SIZE
+    return parts
+
+
+def parse_range(header: Optional[str], file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parses a Range header (RFC 7233) into sorted inclusive byte ranges, overlapping and
+    adjacent ones merged, supporting "a-b", open ended "a-" and suffix "-n" ranges.
+    returns None when the header has to be ignored and the whole file served, which is the
+    case for a missing or malformed header, another unit or more than MAX_RANGES ranges,
+    and an empty list when none of the ranges can be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.partition("-")
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last) or not all(n.isdigit() for n in (first, last) if n):
+            return None
+        if not first:
+            # the last n bytes of the file
+            suffix = int(last)
+            if suffix and file_size:
+                ranges.append((max(file_size - suffix, 0), file_size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < file_size:
+            ranges.append((start, min(int(last), file_size - 1) if last else file_size - 1))
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,229 @@
+import os
+import base64
+import shutil
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+import aiohttp
+from WebStreamer.vars import Var
+from .config_parser import TokenParser
+
+
+def git_blob_sha(content: bytes) -> str:
+    """
+    The sha git (and the GitHub contents API) reports for a file, used to tell
+    whether a session file changed without downloading it again.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+class SessionStore(ABC):
+    """
+    Keeps the pyrogram session files somewhere that survives a redeploy.
+    Subclasses implement fetch, store and stat, the bookkeeping for skipping
+    uploads of unchanged files lives here.
+    attributes:
+        shas: the git blob sha of the stored copy of every synced file.
+    """
+
+    def __init__(self):
+        self.shas: Dict[str, str] = {}
+
+    @abstractmethod
+    async def fetch(self, name: str) -> Optional[bytes]:
+        """
+        Returns the content of the stored copy, None if there is none.
+        """
+
+    @abstractmethod
+    async def store(self, name: str, content: bytes) -> None:
+        """
+        Stores content as the copy of the session file.
+        """
+
+    @abstractmethod
+    async def stat(self, name: str) -> Optional[str]:
+        """
+        Returns the git blob sha of the stored copy, None if there is none.
+        """
+
+    async def close(self) -> None:
+        pass
+
+    async def download(self, name: str) -> bool:
+        """
+        Writes the stored copy of a session file to the working directory,
+        returns False if there was none or it could not be fetched.
+        """
+        try:
+            content = await self.fetch(name)
+        except Exception as e:
+            logging.warning(f"Failed to download {name}, proceeding without session file: {e}")
+            return False
+        if content is None:
+            logging.info(f"{name} not found in the session store, proceeding without session file")
+            return False
+        await asyncio.get_event_loop().run_in_executor(None, self._write, name, content)
+        logging.info(f"Downloaded {name} from the session store")
+        return True
+
+    async def upload(self, name: str) -> bool:
+        """
+        Stores the session file from the working directory unless the stored
+        copy already has the same content, returns True if it was uploaded.
+        """
+        content = await asyncio.get_event_loop().run_in_executor(None, read_file, name)
+        if content is None:
+            logging.info(f"File {name} does not exist, skipping upload")
+            return False
+        sha = git_blob_sha(content)
+        try:
+            if name not in self.shas:
+                stored = await self.stat(name)
+                if stored is not None:
+                    self.shas[name] = stored
+            if self.shas.get(name) == sha:
+                logging.info(f"{name} is unchanged, skipping upload")
+                return False
+            await self.store(name, content)
+        except Exception as e:
+            logging.warning(f"Failed to upload {name}: {e}")
+            return False
+        self.shas[name] = sha
+        logging.info(f"Uploaded {name} to the session store")
+        return True
+
+    def _write(self, name: str, content: bytes) -> None:
+        with open(name, "wb") as file:
+            file.write(content)
+        self.shas[name] = git_blob_sha(content)
+
+
+class LocalSessionStore(SessionStore):
+    def __init__(self, directory: str):
+        """Keeps the session files in a local directory, eg. a mounted volume."""
+        super().__init__()
+        self.directory = directory
+
+    async def fetch(self, name: str) -> Optional[bytes]:
+        return await asyncio.get_event_loop().run_in_executor(
+            None, read_file, os.path.join(self.directory, name)
+        )
+
+    async def store(self, name: str, content: bytes) -> None:
+        await asyncio.get_event_loop().run_in_executor(None, self._store, name, content)
+
+    async def stat(self, name: str) -> Optional[str]:
+        content = await self.fetch(name)
+        return None if content is None else git_blob_sha(content)
+
+    def _store(self, name: str, content: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(content)
+        shutil.move(f"{path}.tmp", path)
+
+
+class GitHubSessionStore(SessionStore):
+    API_URL = "https://api.github.com"
+
+    def __init__(self, token: str, username: str, repo: str, branch: str = "main"):
+        """Keeps the session files in a GitHub repository through the contents API.
+        attributes:
+            token, username, repo, branch: where the files are kept.
+
+        every request goes through one pooled aiohttp session, which is
+        created on first use so it belongs to the running event loop.
+        """
+        super().__init__()
+        self.token = token
+        self.username = username
+        self.repo = repo
+        self.branch = branch
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={
+                    "Authorization": f"token {self.token}",
+                    "Accept": "application/vnd.github+json",
+                },
+                timeout=aiohttp.ClientTimeout(total=60),
+            )
+        return self._session
+
+    def url(self, name: str) -> str:
+        return f"{self.API_URL}/repos/{self.username}/{self.repo}/contents/{name}"
+
+    async def _get(self, name: str) -> Optional[dict]:
+        async with self.session.get(self.url(name), params={"ref": self.branch}) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            return await response.json()
+
+    async def fetch(self, name: str) -> Optional[bytes]:
+        contents = await self._get(name)
+        if contents is None:
+            return None
+        self.shas[name] = contents["sha"]
+        if contents.get("content"):
+            return base64.b64decode(contents["content"])
+        # files over 1 MB come without content, fetch them raw instead
+        async with self.session.get(
+            self.url(name),
+            params={"ref": self.branch},
+            headers={"Accept": "application/vnd.github.raw"},
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def stat(self, name: str) -> Optional[str]:
+        contents = await self._get(name)
+        return None if contents is None else contents["sha"]
+
+    async def store(self, name: str, content: bytes) -> None:
+        data = {
+            "message": f"Update {name}",
+            "content": base64.b64encode(content).decode(),
+            "branch": self.branch,
+        }
+        if name in self.shas:
+            data["sha"] = self.shas[name]
+        async with self.session.put(self.url(name), json=data) as response:
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+def get_session_store() -> Optional[SessionStore]:
+    if Var.SESSION_STORE == "local":
+        return LocalSessionStore(Var.SESSION_STORE_DIR)
+    if Var.SESSION_STORE == "github":
+        parser = TokenParser()
+        if parser.get_github_token():
+            return GitHubSessionStore(
+                parser.get_github_token(),
+                parser.get_github_username(),
+                parser.get_github_repo(),
+                Var.GITHUB_BRANCH,
+            )
+    return None
+
+
+session_store = get_session_store()
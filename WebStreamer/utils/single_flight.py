@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        """Coalesces concurrent calls that share a key into a single in-flight call.
+        attributes:
+            shared: the number of callers that joined a call already in flight.
+
+        the call runs as its own task, so a caller being cancelled (eg. a viewer
+        closing the connection) never cancels the call for the other waiters.
+        """
+        self.shared = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits the call in flight for the key, or starts func() if there is none.
+        every waiter gets the same result or exception.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # mark the exception as retrieved in case every waiter went away
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
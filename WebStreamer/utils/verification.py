@@ -0,0 +1,96 @@
+import hmac
+import time
+from hashlib import sha256
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from WebStreamer.vars import Var
+
+
+class SignatureVerifier:
+    def __init__(self, secrets: List[str], max_entries: int):
+        """Checks the signature of stream links inline on the event loop.
+        attributes:
+            secrets: every secret a link may be signed with, the first one is
+                the current key and the rest are kept around while rotating.
+            max_entries: the number of verified links remembered, 0 disables.
+            hits, misses: counters for inspecting the cache.
+
+        a link is signed either with the legacy scheme, sha256 over
+        "cid|fid|expiration_time|secret", or with HMAC-SHA256 of
+        "cid|fid|expiration_time" keyed by the secret. Verified links are
+        remembered until they expire since players send many range requests
+        for the same link.
+        """
+        self.secrets = [secret.encode("utf-8") for secret in secrets]
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._verified: "OrderedDict[Tuple[str, str, int, str], int]" = OrderedDict()
+
+    def sign(self, cid, fid, expiration_time: int) -> str:
+        """
+        Returns the HMAC signature of a link with the current secret.
+        """
+        message = f"{cid}|{fid}|{expiration_time}".encode("utf-8")
+        return hmac.new(self.secrets[0], message, sha256).hexdigest()
+
+    def _check(self, cid, fid, expiration_time: int, signature: bytes) -> bool:
+        message = f"{cid}|{fid}|{expiration_time}".encode("utf-8")
+        for secret in self.secrets:
+            legacy = sha256(message + b"|" + secret).hexdigest().encode("ascii")
+            keyed = hmac.new(secret, message, sha256).hexdigest().encode("ascii")
+            if hmac.compare_digest(legacy, signature) or hmac.compare_digest(keyed, signature):
+                return True
+        return False
+
+    def verify(self, cid, fid, expiration_time: int, signature: str) -> bool:
+        """
+        Returns True if the link is signed with one of the secrets and has not
+        expired yet.
+        """
+        now = int(time.time())
+        if expiration_time < now:
+            return False
+        key = (str(cid), str(fid), expiration_time, signature)
+        if key in self._verified:
+            self._verified.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        try:
+            signature_bytes = signature.encode("ascii")
+        except UnicodeEncodeError:
+            return False
+        if not self._check(cid, fid, expiration_time, signature_bytes):
+            return False
+        if self.max_entries:
+            self._verified[key] = expiration_time
+            self._evict(now)
+        return True
+
+    def _evict(self, now: int) -> None:
+        while len(self._verified) > self.max_entries:
+            self._verified.popitem(last=False)
+        # drop expired links from the old end, they are usually the first to go
+        while self._verified:
+            key, expiration_time = next(iter(self._verified.items()))
+            if expiration_time >= now:
+                break
+            del self._verified[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._verified),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+verifier = SignatureVerifier(Var.SECRET_KEYS, Var.VERIFIED_LINKS_CACHE_SIZE)
+
+
+def verify_sha256_key(cid, fid, expiration_time, sha256_key) -> bool:
+    try:
+        return verifier.verify(cid, fid, int(expiration_time), sha256_key)
+    except (TypeError, ValueError):
+        return False
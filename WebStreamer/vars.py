@@ -14,6 +14,48 @@ class Var(object):
     BOT_TOKEN = str(environ.get("BOT_TOKEN"))
     SLEEP_THRESHOLD = int(environ.get("SLEEP_THRESHOLD", "60"))  # 1 minte
     WORKERS = int(environ.get("WORKERS", "6"))  # 6 workers = 6 commands at once
+    SCHEDULER_POLICY = str(environ.get("SCHEDULER_POLICY", "weighted_latency"))  # least_loaded, p2c or weighted_latency
+    SCHEDULER_SMOOTHING = float(environ.get("SCHEDULER_SMOOTHING", "0.2"))  # weight of the newest sample
+    FLOOD_TRIP_THRESHOLD = int(environ.get("FLOOD_TRIP_THRESHOLD", "30"))  # FloodWait seconds that trip a client
+    CIRCUIT_ERRORS = int(environ.get("CIRCUIT_ERRORS", "5"))  # failed requests in a row that trip a client
+    CIRCUIT_ERROR_RATE = float(environ.get("CIRCUIT_ERROR_RATE", "0.5"))  # moving error rate that trips a client
+    CIRCUIT_COOLDOWN = int(environ.get("CIRCUIT_COOLDOWN", "60"))  # seconds a client stays tripped after errors
+    READ_AHEAD = int(environ.get("READ_AHEAD", "4"))  # GetFile requests kept in flight per stream
+    WRITE_BUFFER_SIZE = int(environ.get("WRITE_BUFFER_SIZE", "256"))  # KiB buffered per connection before waiting for the client
+    MEDIA_SESSIONS_PER_DC = int(environ.get("MEDIA_SESSIONS_PER_DC", "2"))  # media sessions per client and DC
+    MEDIA_SESSION_IDLE = int(environ.get("MEDIA_SESSION_IDLE", "600"))  # 10 minutes
+    MEDIA_SESSION_ERRORS = int(environ.get("MEDIA_SESSION_ERRORS", "3"))  # failed requests in a row before a session is replaced
+    WARM_DCS = [int(dc) for dc in environ.get("WARM_DCS", "").split(",") if dc.strip()]  # eg. 1,2,3,4,5, empty disables
+    WARM_REFRESH_INTERVAL = int(environ.get("WARM_REFRESH_INTERVAL", "900"))  # 15 minutes
+    FIRST_CHUNK_SIZE = int(environ.get("FIRST_CHUNK_SIZE", "64"))  # KiB of the first request of a range, rounded down to a power of two (4-1024)
+    STRIPE_WIDTH = int(environ.get("STRIPE_WIDTH", "1"))  # clients sharing one large download, 1 disables
+    STRIPE_MIN_SIZE = int(environ.get("STRIPE_MIN_SIZE", "64"))  # MiB a range needs before it's striped
+    CHUNK_CACHE_SIZE = int(environ.get("CHUNK_CACHE_SIZE", "256"))  # MiB of chunks kept in RAM, 0 disables
+    DISK_CACHE_DIR = str(environ.get("DISK_CACHE_DIR", ""))  # empty disables the on-disk chunk cache
+    DISK_CACHE_SIZE = int(environ.get("DISK_CACHE_SIZE", "10240"))  # MiB of chunks kept on disk
+    DISK_CACHE_PENDING_WRITES = int(environ.get("DISK_CACHE_PENDING_WRITES", "16"))  # chunks queued for disk before new ones are skipped
+    FILE_CACHE_SIZE = int(environ.get("FILE_CACHE_SIZE", "100000"))  # file records kept in RAM
+    FILE_CACHE_TTL = int(environ.get("FILE_CACHE_TTL", "1800"))  # 30 minutes
+    METADATA_STORE = str(environ.get("METADATA_STORE", ""))  # SQLite file for file records, empty disables
+    METADATA_STORE_TTL = int(environ.get("METADATA_STORE_TTL", "86400"))  # 1 day
+    INFO_BATCH_LIMIT = int(environ.get("INFO_BATCH_LIMIT", "1000"))  # message IDs per /info/batch call
+    SESSION_STORE = str(environ.get("SESSION_STORE", "github"))  # "github", "local" or empty to disable
+    SESSION_STORE_DIR = str(environ.get("SESSION_STORE_DIR", "sessions"))  # directory for the local session store
+    GITHUB_BRANCH = str(environ.get("GITHUB_BRANCH", "main"))  # branch the GitHub session store commits to
+    SECRET_KEYS = [
+        key.strip()
+        for key in environ.get(
+            "SECRET_KEYS", "647e2c1ac884418b5c270862a9a484105e88b11f097fa9d5ddd09eb4c53737bd"
+        ).split(",")
+        if key.strip()
+    ]  # link signing secrets, the first signs new links and the rest still verify
+    VERIFIED_LINKS_CACHE_SIZE = int(environ.get("VERIFIED_LINKS_CACHE_SIZE", "10000"))  # verified links kept in RAM
+    CACHE_CONTROL = str(environ.get("CACHE_CONTROL", "public, immutable"))  # Cache-Control of file responses, empty disables
+    CACHE_MAX_AGE = int(environ.get("CACHE_MAX_AGE", "31536000"))  # 1 year, capped by the time left on the link
+    MAX_STREAMS = int(environ.get("MAX_STREAMS", "0"))  # streams served at once, 0 for no limit
+    MAX_STREAMS_PER_CLIENT = int(environ.get("MAX_STREAMS_PER_CLIENT", "0"))  # streams a single client serves at once, 0 for no limit
+    STREAM_QUEUE_SIZE = int(environ.get("STREAM_QUEUE_SIZE", "100"))  # requests waiting for a free stream slot before 503s
+    STREAM_QUEUE_TIMEOUT = float(environ.get("STREAM_QUEUE_TIMEOUT", "10"))  # seconds a request waits for a slot
     BIN_CHANNEL = int(
         environ.get("BIN_CHANNEL", None)
     )  # you NEED to use a CHANNEL when you're using MULTI_CLIENT
@@ -0,0 +1,78 @@
+"""
+Benchmarks the streamer against a fake Telegram upstream, eg.
+
+    python -m benchmarks
+    python -m benchmarks sequential burst --clients 4 --latency 80 --flood-rate 0.01
+    python -m benchmarks viewers --viewers 200 --read-rate 512 --tracemalloc
+    python -m benchmarks copies --repeats 20
+"""
+
+import os
+import json
+import asyncio
+import argparse
+import tracemalloc
+
+from . import env
+
+env.setup()
+
+
+def parse_dc_latency(value: str):
+    latencies = {}
+    for pair in filter(None, value.split(",")):
+        dc_id, latency = pair.split("=")
+        latencies[int(dc_id)] = float(latency) / 1000
+    return latencies
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("scenarios", nargs="*", default=["sequential", "seeks", "burst", "viewers", "copies"],
+                        help="sequential, seeks, burst, viewers and/or copies, all of them by default")
+    parser.add_argument("--clients", type=int, default=1, help="number of bots in the pool")
+    parser.add_argument("--dcs", type=lambda v: [int(dc) for dc in v.split(",") if dc], default=[2],
+                        help="DCs the files are spread over, eg. 1,2,4")
+    parser.add_argument("--latency", type=float, default=50, help="GetFile latency in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="random extra GetFile latency in ms")
+    parser.add_argument("--dc-latency", type=parse_dc_latency, default={},
+                        help="GetFile latency of single DCs in ms, eg. 4=250")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of GetFile requests answered with a FloodWait")
+    parser.add_argument("--flood-seconds", type=int, default=3, help="value of the injected FloodWaits")
+    parser.add_argument("--size", type=int, default=32, help="file size in MiB")
+    parser.add_argument("--repeats", type=int, default=3, help="downloads in the sequential and copies scenarios")
+    parser.add_argument("--seeks", type=int, default=50, help="requests in the seeks scenario")
+    parser.add_argument("--viewers", type=int, default=20, help="viewers in the burst and viewers scenarios")
+    parser.add_argument("--read-rate", type=float, default=0, help="KiB/s each viewer reads at, 0 for as fast as possible")
+    parser.add_argument("--chunk-cache", type=int, help="CHUNK_CACHE_SIZE in MiB, 0 disables the cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="check every streamed byte against the fake file")
+    parser.add_argument("--tracemalloc", action="store_true", help="report the traced memory peak, slows everything down")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON lines")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.chunk_cache is not None:
+        os.environ["CHUNK_CACHE_SIZE"] = str(args.chunk_cache)
+    from .harness import SCENARIOS, format_table, run
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)}")
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    rows = []
+    for name in args.scenarios:
+        row = asyncio.run(run(name, args))
+        rows.append(row)
+        if args.json:
+            print(json.dumps(row))
+    if not args.json:
+        print(format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
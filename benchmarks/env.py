@@ -0,0 +1,23 @@
+"""
+WebStreamer reads its configuration on import, setup() fills in what a real
+deployment would set so the app can be imported without credentials.
+"""
+
+import os
+
+DEFAULTS = {
+    "API_ID": "1",
+    "API_HASH": "benchmark",
+    "BOT_TOKEN": "1:benchmark",
+    "BIN_CHANNEL": "-1001234567890",
+    "BIN_CHANNEL_WITHOUT_MINUS": "1001234567890",
+    "SESSION_STORE": "",
+}
+
+
+def setup() -> None:
+    """
+    Sets every variable that isn't set yet, call it before importing WebStreamer.
+    """
+    for name, value in DEFAULTS.items():
+        os.environ.setdefault(name, value)
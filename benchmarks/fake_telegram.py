@@ -0,0 +1,153 @@
+"""
+A local stand-in for the Telegram side of the streamer: clients whose media
+sessions answer upload.GetFile with deterministic bytes after a configurable
+delay, so the real aiohttp app can be benchmarked without live bots.
+"""
+
+import random
+import asyncio
+from typing import Dict, Optional
+from pyrogram import raw
+from pyrogram.errors import FloodWait, LimitInvalid, OffsetInvalid
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Session
+
+# the bytes of every fake file follow a short cycle, so any range can be
+# served as a slice of one precomputed buffer without generating data
+PERIOD = 251
+MAX_LIMIT = 1024 * 1024
+
+
+class Upstream:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        flood_rate: float = 0.0,
+        flood_seconds: int = 3,
+        dc_latency: Optional[Dict[int, float]] = None,
+        seed: int = 0,
+    ):
+        """How the fake DCs behave.
+        attributes:
+            latency, jitter: seconds every GetFile takes, jitter is added uniformly.
+            flood_rate: the share of GetFile requests answered with a FloodWait.
+            flood_seconds: the value of the injected FloodWaits.
+            dc_latency: latency overrides for single DCs, eg. a slow DC 4.
+            requests, floods: counters of what the upstream served.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.dc_latency = dc_latency or {}
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.floods = 0
+        self._buffers: Dict[int, bytes] = {}
+
+    def buffer(self, media_id: int) -> bytes:
+        buffer = self._buffers.get(media_id)
+        if buffer is None:
+            cycle = bytes((i * 7 + media_id) % 256 for i in range(PERIOD))
+            buffer = self._buffers[media_id] = cycle * (MAX_LIMIT // PERIOD + 2)
+        return buffer
+
+    def read(self, media_id: int, file_size: int, offset: int, limit: int) -> bytes:
+        """
+        Returns the bytes of a fake file, what Telegram returns for a GetFile.
+        """
+        end = min(offset + limit, file_size)
+        if end <= offset:
+            return b""
+        start = offset % PERIOD
+        return self.buffer(media_id)[start:start + end - offset]
+
+    def expected(self, media_id: int, file_size: int, from_bytes: int, until_bytes: int) -> bytes:
+        """
+        Returns the inclusive byte range of a fake file, to check what was streamed.
+        """
+        out = bytearray()
+        offset = from_bytes
+        while offset <= until_bytes:
+            size = min(MAX_LIMIT, until_bytes - offset + 1)
+            out += self.read(media_id, file_size, offset, size)
+            offset += size
+        return bytes(out)
+
+    def delay(self, dc_id: int) -> float:
+        return self.dc_latency.get(dc_id, self.latency) + self.random.uniform(0, self.jitter)
+
+
+class FakeSession:
+    def __init__(self, upstream: Upstream, dc_id: int, files: Dict[int, int], sleep_threshold: int = 10):
+        """A media session of a single DC, files maps media ids to their sizes.
+        send answers once and raises FloodWaits like pyrogram's Session.send, invoke
+        sleeps through the ones up to max(SLEEP_THRESHOLD, sleep_threshold) and
+        retries them like Session.invoke, sleep_threshold being the client's.
+        """
+        self.upstream = upstream
+        self.dc_id = dc_id
+        self.files = files
+        self.sleep_threshold = max(Session.SLEEP_THRESHOLD, sleep_threshold)
+        self.is_connected = asyncio.Event()
+        self.is_connected.set()
+
+    async def invoke(self, query, *args, **kwargs):
+        while True:
+            try:
+                return await self.send(query)
+            except FloodWait as e:
+                if e.value > self.sleep_threshold:
+                    raise
+                await asyncio.sleep(e.value)
+
+    async def send(self, query, wait_response: bool = True, timeout: float = Session.WAIT_TIMEOUT):
+        if isinstance(query, raw.functions.help.GetConfig):
+            return None
+        upstream = self.upstream
+        limit, offset = query.limit, query.offset
+        # the same checks Telegram does, so a bad plan fails here too
+        if limit < 4096 or limit > MAX_LIMIT or limit & (limit - 1):
+            raise LimitInvalid()
+        if offset % limit:
+            raise OffsetInvalid()
+        upstream.requests += 1
+        await asyncio.sleep(upstream.delay(self.dc_id))
+        if upstream.flood_rate and upstream.random.random() < upstream.flood_rate:
+            upstream.floods += 1
+            raise FloodWait(value=upstream.flood_seconds)
+        media_id = query.location.id
+        return raw.types.upload.File(
+            type=raw.types.storage.FileUnknown(),
+            mtime=0,
+            bytes=upstream.read(media_id, self.files[media_id], offset, limit),
+        )
+
+    async def stop(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, index: int):
+        """Stands in for a pyrogram Client, the streamer only needs media_sessions."""
+        self.index = index
+        self.media_sessions = {}
+
+    def __repr__(self) -> str:
+        return f"FakeClient({self.index})"
+
+
+def make_file_id(media_id: int, dc_id: int, file_size: int) -> FileId:
+    file_id = FileId(
+        file_type=FileType.DOCUMENT,
+        dc_id=dc_id,
+        media_id=media_id,
+        access_hash=media_id * 31,
+        file_reference=b"bench",
+    )
+    file_id.file_size = file_size
+    file_id.mime_type = "video/mp4"
+    file_id.file_name = f"bench_{media_id}.mp4"
+    file_id.unique_id = f"bench{media_id}"
+    return file_id
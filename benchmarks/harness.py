@@ -0,0 +1,300 @@
+"""
+Runs benchmark scenarios against the real aiohttp app, with the Telegram side
+replaced by the fake upstream. WebStreamer reads its configuration on import,
+so the environment has to be set up before this module is imported, see env.setup.
+"""
+
+import os
+import time
+import random
+import asyncio
+import resource
+import statistics
+import tracemalloc
+from typing import Dict, List, Optional
+import aiohttp
+from aiohttp.test_utils import TestServer
+from WebStreamer import Var
+from WebStreamer.bot import multi_clients, work_loads, client_pool
+from WebStreamer.server import web_server
+from WebStreamer.utils import ByteStreamer, FileRecord, Part, chunk_cache, file_cache, plan_parts, verifier
+from WebStreamer.utils.range_planner import MAX_CHUNK_SIZE
+from .fake_telegram import FakeClient, FakeSession, Upstream, make_file_id
+
+CHANNEL_ID = -1001234567890
+MiB = 1024 * 1024
+
+
+class Result:
+    def __init__(self, ok: bool, status: int, nbytes: int, ttfb: float, duration: float):
+        self.ok = ok
+        self.status = status
+        self.nbytes = nbytes
+        self.ttfb = ttfb
+        self.duration = duration
+
+
+class Bench:
+    def __init__(self, upstream: Upstream, clients: int, dcs: List[int], verify: bool):
+        """The app, the fake clients and the files of a single scenario.
+        attributes:
+            upstream: the fake DCs every client talks to.
+            files: the size of every fake file keyed by its message id.
+            verify: compares every streamed byte with the fake file, slower.
+            extra: scenario specific numbers added to the report.
+        """
+        self.upstream = upstream
+        self.clients = clients
+        self.dcs = dcs
+        self.verify = verify
+        self.files: Dict[int, int] = {}
+        self.sizes: Dict[int, int] = {}
+        self.extra: Dict[str, float] = {}
+        self.server: Optional[TestServer] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._create_media_session = None
+
+    def add_file(self, size: int) -> int:
+        message_id = len(self.files) + 1
+        media_id = 1000 + message_id
+        dc_id = self.dcs[message_id % len(self.dcs)]
+        file_id = make_file_id(media_id, dc_id, size)
+        file_cache.put(CHANNEL_ID, message_id, FileRecord.from_file_id(file_id, CHANNEL_ID, message_id))
+        self.files[message_id] = size
+        self.sizes[media_id] = size
+        return message_id
+
+    def url(self, message_id: int) -> str:
+        expiration_time = int(time.time()) + 3600
+        signature = verifier.sign(CHANNEL_ID, message_id, expiration_time)
+        return f"/{CHANNEL_ID}/{message_id}/{expiration_time}/{signature}"
+
+    async def __aenter__(self) -> "Bench":
+        upstream, sizes = self.upstream, self.sizes
+
+        async def create_media_session(client, dc_id: int) -> FakeSession:
+            return FakeSession(upstream, dc_id, sizes, Var.SLEEP_THRESHOLD)
+
+        # the raw attribute, so the staticmethod can be put back as it was
+        self._create_media_session = ByteStreamer.__dict__["create_media_session"]
+        ByteStreamer.create_media_session = staticmethod(create_media_session)
+        multi_clients.clear()
+        work_loads.clear()
+        client_pool.stats.clear()
+        chunk_cache.clear()
+        for index in range(self.clients):
+            multi_clients[index] = FakeClient(index)
+            work_loads[index] = 0
+        Var.MULTI_CLIENT = self.clients > 1
+
+        self.server = TestServer(web_server())
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            # a stream that stops early leaves the client waiting for the rest of the body
+            timeout=aiohttp.ClientTimeout(total=600, sock_read=30),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.session.close()
+        await self.server.close()
+        ByteStreamer.create_media_session = self._create_media_session
+
+    async def fetch(self, message_id: int, range_header: Optional[str] = None, read_rate: float = 0) -> Result:
+        """
+        Downloads a link and times it, read_rate limits a slow viewer to that many bytes per second.
+        """
+        headers = {"Range": range_header} if range_header else {}
+        started = time.monotonic()
+        ttfb = None
+        nbytes = 0
+        body = bytearray() if self.verify else None
+        try:
+            async with self.session.get(self.server.make_url(self.url(message_id)), headers=headers) as response:
+                status = response.status
+                content_range = response.headers.get("Content-Range")
+                async for data in response.content.iter_any():
+                    if ttfb is None:
+                        ttfb = time.monotonic() - started
+                    nbytes += len(data)
+                    if body is not None:
+                        body += data
+                    if read_rate:
+                        await asyncio.sleep(len(data) / read_rate)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return Result(False, 0, nbytes, ttfb or 0.0, time.monotonic() - started)
+        duration = time.monotonic() - started
+        ok = status in (200, 206)
+        if ok and body is not None:
+            size = self.files[message_id]
+            from_bytes, until_bytes = 0, size - 1
+            if content_range:
+                from_bytes, until_bytes = map(int, content_range.split(" ")[1].split("/")[0].split("-"))
+            ok = bytes(body) == self.upstream.expected(1000 + message_id, size, from_bytes, until_bytes)
+        return Result(ok, status, nbytes, ttfb or duration, duration)
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MiB
+    except (OSError, ValueError):
+        # ru_maxrss is in KiB on Linux, the peak rather than the current size
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(name: str, results: List[Result], wall: float, upstream: Upstream) -> Dict[str, float]:
+    ttfbs = [r.ttfb for r in results if r.ok]
+    durations = [r.duration for r in results if r.ok]
+    nbytes = sum(r.nbytes for r in results)
+    summary = {
+        "scenario": name,
+        "requests": len(results),
+        "errors": sum(not r.ok for r in results),
+        "MiB": round(nbytes / MiB, 1),
+        "MiB/s": round(nbytes / MiB / wall, 1) if wall else 0.0,
+        "ttfb_p50_ms": round(statistics.median(ttfbs) * 1000, 1) if ttfbs else 0.0,
+        "ttfb_p99_ms": round(percentile(ttfbs, 0.99) * 1000, 1),
+        "latency_p99_ms": round(percentile(durations, 0.99) * 1000, 1),
+        "getfile": upstream.requests,
+        "floods": upstream.floods,
+        "rss_MiB": round(rss_mib(), 1),
+    }
+    if tracemalloc.is_tracing():
+        summary["traced_peak_MiB"] = round(tracemalloc.get_traced_memory()[1] / MiB, 1)
+    return summary
+
+
+async def sequential(bench: Bench, size: int, repeats: int) -> List[Result]:
+    """One viewer downloading a whole file several times, the first one cold."""
+    message_id = bench.add_file(size)
+    return [await bench.fetch(message_id) for _ in range(repeats)]
+
+
+async def seeks(bench: Bench, size: int, count: int, seed: int = 1) -> List[Result]:
+    """A player seeking around a file, 1 MiB reads at random offsets and trailer probes."""
+    message_id = bench.add_file(size)
+    rand = random.Random(seed)
+    results = []
+    for i in range(count):
+        if i % 5 == 0:
+            range_header = "bytes=-65536"
+        else:
+            start = rand.randrange(0, size - MiB)
+            range_header = f"bytes={start}-{start + MiB - 1}"
+        results.append(await bench.fetch(message_id, range_header))
+    return results
+
+
+async def burst(bench: Bench, size: int, viewers: int, seed: int = 2) -> List[Result]:
+    """A link shared in a busy chat, many viewers opening the same file at once."""
+    message_id = bench.add_file(size)
+    rand = random.Random(seed)
+
+    async def viewer() -> Result:
+        await asyncio.sleep(rand.uniform(0, 0.05))
+        return await bench.fetch(message_id)
+
+    return await asyncio.gather(*[viewer() for _ in range(viewers)])
+
+
+async def viewers(bench: Bench, size: int, count: int, read_rate: float = 0) -> List[Result]:
+    """Many viewers watching different files at the same time."""
+    message_ids = [bench.add_file(size) for _ in range(count)]
+    return await asyncio.gather(*[bench.fetch(message_id, read_rate=read_rate) for message_id in message_ids])
+
+
+async def copies(bench: Bench, size: int, count: int, seed: int = 3) -> List[Result]:
+    """
+    Streams unaligned ranges of a cached file straight out of yield_file and counts
+    the bytes copied between the chunk cache and the consumer, plus the traced
+    allocation peak, to keep the chunk path zero-copy.
+    """
+    message_id = bench.add_file(size)
+    streamer = ByteStreamer.for_client(multi_clients[0])
+    record = await streamer.get_file_properties(message_id, CHANNEL_ID)
+    async for _ in streamer.yield_file(record, 0, plan_parts(0, size - 1)):
+        pass
+
+    rand = random.Random(seed)
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    results = []
+    streamed = copied = 0
+    for _ in range(count):
+        from_bytes = rand.randrange(0, size // 2)
+        until_bytes = rand.randrange(size // 2, size)
+        parts = plan_parts(from_bytes, until_bytes, Var.FIRST_CHUNK_SIZE * 1024)
+        started = time.monotonic()
+        ttfb = None
+        nbytes = 0
+        async for chunk, part in zip_parts(streamer.yield_file(record, 0, parts), parts):
+            if ttfb is None:
+                ttfb = time.monotonic() - started
+            cached = chunk_cache.get(record.media_id, part.offset - part.offset % MAX_CHUNK_SIZE)
+            if cached is None or not (chunk is cached or getattr(chunk, "obj", None) is cached):
+                copied += len(chunk)
+            nbytes += len(chunk)
+        streamed += nbytes
+        results.append(Result(nbytes == until_bytes - from_bytes + 1, 206, nbytes, ttfb or 0.0, time.monotonic() - started))
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    bench.extra["copied_KiB_per_MiB"] = round(copied / 1024 / (streamed / MiB), 1) if streamed else 0.0
+    bench.extra["alloc_peak_KiB"] = round(peak / 1024, 1)
+    return results
+
+
+async def zip_parts(body, parts: List[Part]):
+    # yield_file yields one chunk per planned part, in order
+    index = 0
+    async for chunk in body:
+        yield chunk, parts[index]
+        index += 1
+
+
+SCENARIOS = {
+    "sequential": lambda bench, args: sequential(bench, args.size * MiB, args.repeats),
+    "seeks": lambda bench, args: seeks(bench, args.size * MiB, args.seeks),
+    "burst": lambda bench, args: burst(bench, args.size * MiB, args.viewers),
+    "viewers": lambda bench, args: viewers(bench, args.size * MiB, args.viewers, args.read_rate * 1024),
+    "copies": lambda bench, args: copies(bench, args.size * MiB, args.repeats),
+}
+
+
+async def run(name: str, args) -> Dict[str, float]:
+    upstream = Upstream(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        flood_rate=args.flood_rate,
+        flood_seconds=args.flood_seconds,
+        dc_latency=args.dc_latency,
+        seed=args.seed,
+    )
+    async with Bench(upstream, args.clients, args.dcs, args.verify) as bench:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        started = time.monotonic()
+        results = await SCENARIOS[name](bench, args)
+        wall = time.monotonic() - started
+    return {**summarize(name, results, wall, upstream), **bench.extra}
+
+
+def format_table(rows: List[Dict[str, float]]) -> str:
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in rows)) for c in columns}
+    lines = ["  ".join(c.rjust(widths[c]) for c in columns)]
+    for row in rows:
+        lines.append("  ".join(str(row.get(c, "")).rjust(widths[c]) for c in columns))
+    return "\n".join(lines)
@@ -0,0 +1,23 @@
+"""
+Streams unaligned ranges of a cached file through yield_file and checks that
+the chunk path stays zero-copy, see the copies benchmark scenario.
+"""
+
+import asyncio
+from benchmarks.fake_telegram import Upstream
+from benchmarks.harness import MiB, Bench, copies
+
+# a single copied chunk is up to a MiB, the views and generator frames of a stream are far below this
+ALLOC_PEAK_KIB = 256
+
+
+def test_cached_ranges_are_not_copied():
+    async def run():
+        async with Bench(Upstream(latency=0, jitter=0), 1, [2], verify=False) as bench:
+            results = await copies(bench, 8 * MiB, 10)
+        return bench, results
+
+    bench, results = asyncio.run(run())
+    assert all(result.ok for result in results)
+    assert bench.extra["copied_KiB_per_MiB"] == 0
+    assert bench.extra["alloc_peak_KiB"] < ALLOC_PEAK_KIB